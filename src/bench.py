@@ -0,0 +1,506 @@
+# bench.py
+# Pruebas de rendimiento del compilador. Uso: python3 bench.py <prueba>
+import glob
+import os
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Tiempo máximo (en segundos) que puede tardar en arrancar el compilador
+# con las tablas ya cacheadas: construir lexer y parser en un proceso nuevo.
+STARTUP_BUDGET = 0.25
+
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+from lexer import ViperLexer
+from parser import ViperParser
+lexer = ViperLexer("bench.vip")
+lexer.build(optimize={optimize})
+ViperParser(lexer).build(optimize={optimize})
+print(time.perf_counter() - start)
+"""
+
+
+def _startup_time(optimize):
+    """Lanza un intérprete nuevo y devuelve lo que tarda en construir lexer y parser."""
+    script = STARTUP_SCRIPT.format(optimize=optimize)
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def bench_startup(runs=5):
+    """
+    Mide el arranque en frío con y sin el modo optimizado. La primera
+    ejecución optimizada genera la caché, por eso se descarta.
+    """
+    _startup_time(True)
+    debug = sorted(_startup_time(False) for _ in range(runs))[runs // 2]
+    optimized = sorted(_startup_time(True) for _ in range(runs))[runs // 2]
+
+    print(f"Arranque (debug=True):  {debug * 1000:.1f} ms")
+    print(f"Arranque (optimizado):  {optimized * 1000:.1f} ms")
+    print(f"Presupuesto:            {STARTUP_BUDGET * 1000:.1f} ms")
+    return optimized <= STARTUP_BUDGET
+
+
+def sample_source(repeat):
+    """Concatena repeat veces los ficheros de prueba sin comentarios multilínea"""
+    sources = []
+    for path in sorted(glob.glob(os.path.join(SRC_DIR, "test_files/input/*.vip"))):
+        with open(path) as file:
+            content = file.read()
+        if "'''" not in content:
+            sources.append(content)
+    return "\n".join(sources) * repeat
+
+
+def bench_tokens(repeat=200):
+    """
+    Compara la memoria por token de una lista de LexToken de PLY con la del
+    TokenBuffer basado en arrays.
+    """
+    from lexer import TokenBuffer, ViperLexer
+
+    content = sample_source(repeat)
+    viper_lexer = ViperLexer("bench.vip")
+    viper_lexer.build(optimize=True)
+
+    def measure(collect):
+        viper_lexer.lexer.input(content)
+        viper_lexer.lexer.lineno = 1
+        tracemalloc.start()
+        tokens = collect(iter(viper_lexer.lexer.token, None))
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return memory, len(tokens)
+
+    def collect_buffer(tokens):
+        buffer = TokenBuffer(viper_lexer.lexer, content)
+        for token in tokens:
+            buffer.append(token)
+        return buffer
+
+    lex_memory, count = measure(list)
+    buffer_memory, _ = measure(collect_buffer)
+
+    print(f"Tokens:               {count}")
+    print(f"Lista de LexToken:    {lex_memory / count:.1f} bytes/token")
+    print(f"TokenBuffer (arrays): {buffer_memory / count:.1f} bytes/token")
+    return buffer_memory < lex_memory
+
+
+def bench_supplant(rules=500, repeat=200):
+    """
+    Compara el %supplant de una pasada con aplicar las reglas una a una con
+    str.replace (lo que hacía antes preprocess) sobre un fichero grande.
+    """
+    from lexer import supplant
+
+    content = sample_source(repeat)
+    # Una regla por identificador del fichero (más reglas sintéticas hasta
+    # llegar a rules). Ninguna clave contiene a otra ni aparece en un valor,
+    # así que ambos métodos deben dar el mismo resultado.
+    words = set(re.findall(r"[a-z_][a-z0-9_]*", content))
+    words = {w for w in words if not any(w != o and w in o for o in words)}
+    words |= {f"sintetico{i}_" for i in range(rules - len(words))}
+    replacements = {word: word.upper() for word in sorted(words)}
+
+    start = time.perf_counter()
+    expected = content
+    for old, new in replacements.items():
+        expected = expected.replace(old, new)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = supplant(content, replacements)
+    single_pass = time.perf_counter() - start
+
+    print(f"Fichero:              {len(content) / 1024:.0f} KiB")
+    print(f"Reglas:               {len(replacements)}")
+    print(f"str.replace en bucle: {sequential * 1000:.1f} ms")
+    print(f"Una pasada:           {single_pass * 1000:.1f} ms")
+    return result == expected and single_pass < sequential
+
+
+def bench_infer(length=300, queries=200):
+    """
+    Tipa muchas veces una cadena a + b + c + ... (como hace el parser al
+    comprobar declaraciones, condiciones y mensajes de error) con la caché de
+    tipos y forzando a recalcularla con una generación de ámbito nueva cada vez.
+    """
+    from objects import BinaryExpr, Literal
+    from tables import Recordtable, SymbolTable
+
+    expression = Literal(0)
+    for value in range(1, length):
+        expression = BinaryExpr("+", expression, Literal(value))
+    symbols, records = SymbolTable(), Recordtable()
+
+    start = time.perf_counter()
+    for _ in range(queries):
+        symbols.clear_scopes()
+        expression.infer_type(symbols, records)
+    uncached = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(queries):
+        expression.infer_type(symbols, records)
+    cached = time.perf_counter() - start
+
+    print(f"Nodos:                {length * 2 - 1}")
+    print(f"Sin caché:            {uncached * 1000:.1f} ms")
+    print(f"Con caché:            {cached * 1000:.1f} ms")
+    return cached < uncached
+
+
+def bench_comments(blocks=2000, lines=25):
+    """
+    Tokeniza un fichero formado casi solo por comentarios multilínea y
+    compara el coste de reconocerlos con el patrón anterior '''(.|\\n)*'''
+    (aplicado a cada comentario por separado, porque sobre el fichero entero
+    se tragaría todo hasta el último ''') con la búsqueda lineal del cierre.
+    """
+    from lexer import ViperLexer
+    from scanner import comment_end
+
+    comment = "'''\n" + "Comentario de prueba con bastante texto.\n" * lines + "'''\n"
+    content = (comment + "int a = 1\n") * blocks
+    starts = range(0, len(content), len(comment) + len("int a = 1\n"))
+
+    old_pattern = re.compile(r"'''(.|\n)*'''")
+    start = time.perf_counter()
+    for _ in starts:
+        old_pattern.match(comment)
+    backtracking = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for position in starts:
+        comment_end(content, position)
+    linear = time.perf_counter() - start
+
+    viper_lexer = ViperLexer("bench.vip")
+    viper_lexer.build(optimize=True)
+    viper_lexer.lexer.input(content)
+    viper_lexer.lexer.lineno = 1
+    start = time.perf_counter()
+    tokens = sum(1 for _ in iter(viper_lexer.lexer.token, None))
+    lexing = time.perf_counter() - start
+
+    print(f"Fichero:              {len(content) / 1024:.0f} KiB, {blocks} comentarios")
+    print(f"Patrón anterior:      {backtracking * 1000:.1f} ms")
+    print(f"Búsqueda del cierre:  {linear * 1000:.1f} ms")
+    print(f"Tokenizar el fichero: {lexing * 1000:.1f} ms ({tokens} tokens)")
+    lines_ok = viper_lexer.lexer.lineno == content.count("\n") + 1
+    # Cada bloque: NEWLINE tras el comentario y la declaración con su NEWLINE
+    return lines_ok and tokens == blocks * 6 and linear < backtracking
+
+
+def bench_scanner(repeat=200, runs=5):
+    """
+    Tokens por segundo del lexer de PLY y del escáner escrito a mano
+    (ViperLexer con fast_scanner) sobre los ficheros de prueba.
+    """
+    from lexer import ViperLexer
+
+    content = sample_source(repeat)
+    rates = {}
+    for fast_scanner in (False, True):
+        viper_lexer = ViperLexer("bench.vip", fast_scanner=fast_scanner)
+        viper_lexer.build(optimize=True)
+        times = []
+        for _ in range(runs):
+            viper_lexer.lexer.input(content)
+            viper_lexer.lexer.lineno = 1
+            start = time.perf_counter()
+            count = sum(1 for _ in iter(viper_lexer.lexer.token, None))
+            times.append(time.perf_counter() - start)
+        rates[fast_scanner] = count / sorted(times)[runs // 2]
+
+    print(f"Tokens:               {count}")
+    print(f"PLY:                  {rates[False]:,.0f} tokens/s")
+    print(f"Escáner a mano:       {rates[True]:,.0f} tokens/s")
+    return rates[True] > rates[False]
+
+
+def bench_literals(lines=20000, runs=3):
+    """
+    Tokeniza (ViperLexer.run con single_pass) un fichero lleno de literales
+    numéricos, como las tablas de datos generadas, convirtiendo cada literal
+    en su regla o en bloque al terminar (deferred_literals), con ambos
+    backends. El .token debe salir idéntico.
+    """
+    import tempfile
+
+    from lexer import ViperLexer
+
+    row = ", ".join(
+        f"{value}" for value in ("0x1F", "12", "0b101", "3.25", "0o17", "1e3", "0")
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        route = os.path.join(directory, "literals.vip")
+        with open(route, "w") as file:
+            for line in range(lines):
+                file.write(f"f({row}, {line}, {line}.5)\n")
+
+        results = {}
+        for fast_scanner in (False, True):
+            for deferred in (False, True):
+                viper_lexer = ViperLexer(
+                    route,
+                    single_pass=True,
+                    fast_scanner=fast_scanner,
+                    deferred_literals=deferred,
+                )
+                viper_lexer.build(optimize=True)
+                times = []
+                for _ in range(runs):
+                    viper_lexer.reset(route)
+                    start = time.perf_counter()
+                    viper_lexer.run()
+                    times.append(time.perf_counter() - start)
+                with open(viper_lexer.output_file) as file:
+                    results[fast_scanner, deferred] = (min(times), file.read())
+
+    for fast_scanner, name in ((False, "PLY"), (True, "Escáner a mano")):
+        eager, _ = results[fast_scanner, False]
+        deferred, _ = results[fast_scanner, True]
+        print(f"{name + ':':<22}{eager * 1000:.1f} ms -> {deferred * 1000:.1f} ms")
+    outputs = {output for _, output in results.values()}
+    faster = all(results[f, True][0] < results[f, False][0] for f in (False, True))
+    return len(outputs) == 1 and faster
+
+
+# Programa con bucles para medir la ejecución: suma de una serie y
+# recorrido de un vector dentro de funciones
+LOOP_PROGRAM = """
+def int series(int n): {
+    int total = 0
+    int half = n / 2
+    int i = 0
+    while i < n: {
+        if i < half: {
+            total = total + i
+        } else: {
+            total = total - 1
+        }
+        i = i + 1
+    }
+    return total
+}
+
+def float fill(int n): {
+    float [64] v
+    float sum = 0.0
+    int i = 0
+    int j = 0
+    while i < n: {
+        v[j] = i * 0.5
+        sum = sum + v[j]
+        j = j + 1
+        if j == 64: {
+            j = 0
+        }
+        i = i + 1
+    }
+    return sum
+}
+
+int total = series({size})
+float sum = fill({size})
+"""
+
+
+def bench_interpreter(size=20000, runs=3):
+    """
+    Instrucciones por segundo del intérprete de árbol (main.py --run) sobre
+    un programa dominado por bucles while.
+    """
+    import tempfile
+
+    from interpreter import interpret
+
+    with tempfile.TemporaryDirectory() as directory:
+        route = os.path.join(directory, "loops.vip")
+        with open(route, "w") as file:
+            file.write(LOOP_PROGRAM.replace("{size}", str(size)))
+        rates = []
+        for _ in range(runs):
+            executed = interpret(route)
+            if executed is None:
+                return False
+            interpreter, _ = executed
+            rates.append(interpreter.rate())
+
+    print(f"Instrucciones:        {interpreter.instructions}")
+    print(f"Intérprete de árbol:  {sorted(rates)[runs // 2]:,.0f} instrucciones/s")
+    return interpreter.instructions > 0
+
+
+# Microbenchmarks de la máquina virtual: nombre -> programa ({size} es el
+# número de vueltas del bucle principal)
+VM_PROGRAMS = {
+    "aritmética": """
+int total = 0
+float mean = 0.0
+int i = 0
+while i < {size}: {
+    total = total + i - 3
+    mean = mean + i * 0.5
+    i = i + 1
+}
+""",
+    "vectores": """
+int [256] v
+int i = 0
+int j = 0
+int sum = 0
+while i < {size}: {
+    v[j] = v[j] + i
+    sum = sum + v[j]
+    j = j + 1
+    if j == 256: {
+        j = 0
+    }
+    i = i + 1
+}
+""",
+    "registros": """
+type particle: {
+    float x
+    float v
+    int hits
+}
+
+def particle step(particle p; int n): {
+    int i = 0
+    while i < n: {
+        p.x = p.x + p.v
+        if p.x > 100.0 or p.x < 0.0: {
+            p.v = 0.0 - p.v
+            p.hits = p.hits + 1
+        }
+        i = i + 1
+    }
+    return p
+}
+
+particle p
+p.v = 1.5
+p = step(p, {size})
+""",
+    "llamadas": """
+def int clamp(int x; int lo; int hi): {
+    int r = x
+    if x < lo: {
+        r = lo
+    }
+    if x > hi: {
+        r = hi
+    }
+    return r
+}
+
+int total = 0
+int i = 0
+while i < {size}: {
+    total = total + clamp(i - 500, 0, 1000)
+    i = i + 1
+}
+""",
+    "anidados": """
+int [{size}] v
+int i = 0
+while i < {size}: {
+    v[i] = {size} - i
+    i = i + 1
+}
+i = 0
+while i < {size}: {
+    int j = 0
+    while j < {size} - 1 - i: {
+        if v[j] > v[j + 1]: {
+            int t = v[j]
+            v[j] = v[j + 1]
+            v[j + 1] = t
+        }
+        j = j + 1
+    }
+    i = i + 1
+}
+""",
+}
+VM_SIZES = {"anidados": 120}
+
+
+def bench_vm(size=20000, runs=3):
+    """
+    Tiempo de cada microbenchmark con el intérprete de árbol y con la
+    máquina virtual de bytecode (compilación incluida). Ambos tienen que
+    dejar las mismas variables globales.
+    """
+    import tempfile
+
+    from interpreter import Interpreter, parse_program
+    from vm import VirtualMachine
+
+    ok = True
+    print(f"{'Programa':<14}{'Árbol':>10}{'Bytecode':>12}{'Aceleración':>14}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, source in VM_PROGRAMS.items():
+            route = os.path.join(directory, "vm.vip")
+            with open(route, "w") as file:
+                file.write(source.replace("{size}", str(VM_SIZES.get(name, size))))
+            parsed = parse_program(route)
+            if parsed is None:
+                return False
+            program, viper_parser = parsed
+
+            results = {}
+            for engine in (Interpreter, VirtualMachine):
+                times = []
+                for _ in range(runs):
+                    runner = engine(viper_parser.record_table)
+                    runner.run(program)
+                    times.append(runner.elapsed)
+                results[engine] = (min(times), runner.dump(viper_parser.symbol_table))
+
+            tree, tree_globals = results[Interpreter]
+            vm, vm_globals = results[VirtualMachine]
+            print(
+                f"{name:<14}{tree * 1000:>8.1f}ms{vm * 1000:>10.1f}ms"
+                f"{tree / vm:>13.1f}x"
+            )
+            ok = ok and tree_globals == vm_globals and vm < tree
+    return ok
+
+
+BENCHMARKS = {
+    "startup": bench_startup,
+    "tokens": bench_tokens,
+    "supplant": bench_supplant,
+    "infer": bench_infer,
+    "comments": bench_comments,
+    "scanner": bench_scanner,
+    "literals": bench_literals,
+    "interpreter": bench_interpreter,
+    "vm": bench_vm,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in BENCHMARKS:
+        print(f"Usage: python3 bench.py <{'|'.join(BENCHMARKS)}>")
+        exit(1)
+
+    exit(0 if BENCHMARKS[sys.argv[1]]() else 1)
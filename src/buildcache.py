@@ -0,0 +1,58 @@
+# buildcache.py
+# Caché de las tablas precalculadas de PLY (lexer y LALR) para el modo optimizado
+import hashlib
+import importlib.util
+import os
+
+import ply
+
+# Directorio local del paquete donde se guardan las tablas generadas
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ply_cache")
+
+# Se incrementa si cambia el formato de lo que se guarda en la caché
+CACHE_VERSION = 1
+
+
+def grammar_hash(module, prefix, extra=()):
+    """
+    Calcula un hash de las reglas de `module` (atributos que empiezan por
+    `prefix`) junto con los atributos de `extra`. Las reglas se recorren en
+    orden de definición, igual que hace PLY, por lo que reordenarlas también
+    invalida la caché.
+    """
+    digest = hashlib.sha256(f"{ply.__version__}:{CACHE_VERSION}".encode())
+
+    rules = []
+    for name in dir(module):
+        if not name.startswith(prefix):
+            continue
+        rule = getattr(module, name)
+        if callable(rule):
+            line = rule.__code__.co_firstlineno
+            rules.append((line, name, rule.__doc__ or ""))
+        else:
+            rules.append((0, name, repr(rule)))
+
+    for _, name, text in sorted(rules):
+        digest.update(f"{name}={text}\n".encode())
+    for name in extra:
+        digest.update(f"{name}={getattr(module, name, None)!r}\n".encode())
+
+    return digest.hexdigest()[:16]
+
+
+def table_path(name, digest, extension):
+    """Ruta dentro de la caché para la tabla `name` con el hash `digest`."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, f"{name}_{digest}{extension}")
+
+
+def load_module(path):
+    """Carga un módulo de tabla generado por PLY desde su ruta, o None si no existe."""
+    if not os.path.exists(path):
+        return None
+    module_name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,476 @@
+# bytecode.py
+# Compilador del AST de ViperParser (objects.Program) a bytecode para la
+# máquina de pila de vm.py. El programa principal y cada función se
+# compilan a un CodeUnit: las instrucciones se guardan en un array('i') como
+# pares (código de operación, operando) y lo que no es un entero (literales,
+# nombres de atributo, tipos) va a su tabla de constantes. Las variables se
+# resuelven al compilar a posiciones (slots) del marco de la función.
+# Los programas que se compilan no tienen errores, así que el tipo de cada
+# expresión se conoce y las conversiones de typerules se deciden aquí: solo
+# se emiten las que hacen falta.
+# Uso: python3 bytecode.py <fichero.vip>  muestra el bytecode de cada función
+import sys
+from array import array
+
+from datatypes import CHAR, FLOAT, INT, PRIMITIVES
+from interpreter import ZEROS, literal_value, parse_program
+from objects import (
+    Assignment,
+    BinaryExpr,
+    Declaration,
+    FunctionCall,
+    FunctionDefinition,
+    IfStatement,
+    Literal,
+    TypeDefinition,
+    UnaryExpr,
+    VariableRef,
+    Vector,
+    WhileStatement,
+)
+from typerules import ARITHMETIC, MULTIPLICATIVE, binary_result, unary_result
+
+# Códigos de operación. Las instrucciones binarias (las que van antes de
+# BINARY_END) toman el operando derecho según su operando: 0 es la cima de
+# la pila, k + 1 la constante k y -(s + 1) la variable del slot s, así que
+# `i + 1` o `i < n` no necesitan apilar antes el operando. El resto usan
+# el operando como slot (LOAD, STORE), índice de la tabla de constantes
+# (CONST, FIELD, STORE_FIELD, CONVERT, NEW_VECTOR, NEW_RECORD), destino de
+# salto o índice de función (CALL)
+OPCODES = (
+    "ADD",
+    "SUB",
+    "MUL",
+    "DIV",
+    "LT",
+    "GT",
+    "LE",
+    "GE",
+    "EQ",
+    "NE",
+    "INDEX",
+    "STORE_INDEX",
+    "LOAD",
+    "CONST",
+    "STORE",
+    "JUMP_IF_TRUE",
+    "JUMP_IF_FALSE",
+    "JUMP",
+    "FIELD",
+    "STORE_FIELD",
+    "TO_FLOAT",
+    "ORD",
+    "CONVERT",
+    "NEG",
+    "NOT",
+    "DUP",
+    "POP",
+    "CALL",
+    "RETURN",
+    "NEW_VECTOR",
+    "NEW_RECORD",
+    "JUMP_IF_FALSE_OR_POP",
+    "JUMP_IF_TRUE_OR_POP",
+    "HALT",
+)
+(
+    ADD,
+    SUB,
+    MUL,
+    DIV,
+    LT,
+    GT,
+    LE,
+    GE,
+    EQ,
+    NE,
+    INDEX,
+    STORE_INDEX,
+    LOAD,
+    CONST,
+    STORE,
+    JUMP_IF_TRUE,
+    JUMP_IF_FALSE,
+    JUMP,
+    FIELD,
+    STORE_FIELD,
+    TO_FLOAT,
+    ORD,
+    CONVERT,
+    NEG,
+    NOT,
+    DUP,
+    POP,
+    CALL,
+    RETURN,
+    NEW_VECTOR,
+    NEW_RECORD,
+    JUMP_IF_FALSE_OR_POP,
+    JUMP_IF_TRUE_OR_POP,
+    HALT,
+) = range(len(OPCODES))
+BINARY_END = STORE_INDEX + 1
+
+BINARY_OPCODES = {
+    "+": ADD,
+    "-": SUB,
+    "*": MUL,
+    "/": DIV,
+    "<": LT,
+    ">": GT,
+    "<=": LE,
+    ">=": GE,
+    "==": EQ,
+    "!=": NE,
+}
+JUMPS = (
+    JUMP,
+    JUMP_IF_TRUE,
+    JUMP_IF_FALSE,
+    JUMP_IF_FALSE_OR_POP,
+    JUMP_IF_TRUE_OR_POP,
+)
+# Símbolo de cada comparación, para los errores de ejecución
+COMPARISON_SYMBOLS = {
+    opcode: op for op, opcode in BINARY_OPCODES.items() if LT <= opcode <= NE
+}
+
+
+def static_type(node):
+    """Tipo de una expresión ya comprobada (o de una asignación en cadena)"""
+    if isinstance(node, BinaryExpr):
+        return binary_result(node.op, static_type(node.left), static_type(node.right))
+    if isinstance(node, UnaryExpr):
+        return unary_result(node.op, static_type(node.expr))
+    if isinstance(node, Assignment):
+        return node.target.datatype
+    # Literal (datatype lo fija el parser), VariableRef y FunctionCall
+    return node.datatype
+
+
+def is_aggregate(node):
+    """Indica si el valor de la expresión es un vector entero. Su tipo es el
+    de los elementos, así que no se distingue por el tipo"""
+    if isinstance(node, Assignment):
+        return is_aggregate(node.target)
+    if isinstance(node, VariableRef) and isinstance(node.symbol, Vector):
+        return not node.ref_chain or node.ref_chain[-1][0] == "field"
+    return False
+
+
+class CodeUnit:
+    """Bytecode del programa principal o de una función"""
+
+    def __init__(self, name, parameters=()):
+        self.name = name
+        # Variable/Vector de los parámetros: ocupan los primeros slots
+        self.parameters = list(parameters)
+        self.code = array("i")
+        self.constants = []
+        # nombre -> slot, en orden de slot
+        self.slots = {}
+        self._constant_ids = {}
+        for parameter in self.parameters:
+            self.slot(parameter.name)
+
+    @property
+    def names(self):
+        """Nombre de la variable de cada slot"""
+        return list(self.slots)
+
+    def slot(self, name):
+        return self.slots.setdefault(name, len(self.slots))
+
+    def constant(self, value):
+        # 1, 1.0 y True son iguales con ==: la clave incluye el tipo
+        key = (type(value), value)
+        if key not in self._constant_ids:
+            self._constant_ids[key] = len(self.constants)
+            self.constants.append(value)
+        return self._constant_ids[key]
+
+    def emit(self, opcode, operand=0):
+        """Añade una instrucción y devuelve su posición"""
+        self.code.append(opcode)
+        self.code.append(operand)
+        return len(self.code) - 2
+
+    def patch(self, position, target=None):
+        """Fija el destino del salto de position (por defecto, la siguiente
+        instrucción que se emita)"""
+        self.code[position + 1] = len(self.code) if target is None else target
+
+    def __len__(self):
+        return len(self.code)
+
+
+class Compiler:
+    """
+    Compila un objects.Program. compile() devuelve el CodeUnit del programa
+    principal; functions tiene el de cada función, en el orden en que se
+    definen, que es el índice que usa CALL.
+    """
+
+    def __init__(self):
+        self.functions = []
+        self._function_ids = {}
+        self._unit = None
+        self._statements = {
+            Declaration: self._declaration,
+            Assignment: self._assignment,
+            IfStatement: self._if,
+            WhileStatement: self._while,
+            FunctionDefinition: self._function_definition,
+            TypeDefinition: self._type_definition,
+        }
+        self._expressions = {
+            Literal: self._literal,
+            VariableRef: self._reference,
+            BinaryExpr: self._binary,
+            UnaryExpr: self._unary,
+            FunctionCall: self._call,
+            Assignment: lambda node: self._assignment(node, keep=True),
+        }
+
+    def compile(self, program):
+        main = self._unit = CodeUnit("<programa>")
+        self._block(program.statements)
+        main.emit(HALT)
+        return main
+
+    # ——— Sentencias ——————————————————————————————————————————
+
+    def _block(self, statements):
+        for statement in statements:
+            handler = self._statements.get(type(statement))
+            if handler is not None:
+                handler(statement)
+            else:
+                # Expresión como sentencia: se descarta su valor
+                self._expression(statement)
+                self._unit.emit(POP)
+
+    def _declaration(self, node):
+        unit = self._unit
+        if node.init is None:
+            for variable in node.variables:
+                self._zero(variable)
+                unit.emit(STORE, unit.slot(variable.name))
+            return
+
+        # El valor inicial se evalúa una vez y se asigna a todas
+        self._expression(node.init)
+        last = len(node.variables) - 1
+        for position, variable in enumerate(node.variables):
+            if position < last:
+                unit.emit(DUP)
+            self._convert(node.init, variable.datatype)
+            unit.emit(STORE, unit.slot(variable.name))
+
+    def _assignment(self, node, keep=False):
+        """Con keep el valor asignado queda en la pila (asignación en cadena)"""
+        unit = self._unit
+        target = node.target
+        self._expression(node.value)
+        self._convert(node.value, target.datatype)
+        if keep:
+            unit.emit(DUP)
+
+        if not target.ref_chain:
+            unit.emit(STORE, unit.slot(target.name))
+            return
+        unit.emit(LOAD, unit.slot(target.name))
+        for access in target.ref_chain[:-1]:
+            self._access(access)
+        kind, payload = target.ref_chain[-1]
+        if kind == "field":
+            unit.emit(STORE_FIELD, unit.constant(payload))
+        else:
+            unit.emit(STORE_INDEX, self._operand(payload, numeric=True))
+
+    def _if(self, node):
+        unit = self._unit
+        self._expression(node.condition)
+        skip_body = unit.emit(JUMP_IF_FALSE)
+        self._block(node.body)
+        if node.orelse:
+            skip_orelse = unit.emit(JUMP)
+            unit.patch(skip_body)
+            self._block(node.orelse)
+            unit.patch(skip_orelse)
+        else:
+            unit.patch(skip_body)
+
+    def _while(self, node):
+        # La condición va detrás del cuerpo: cada vuelta ejecuta un único salto
+        unit = self._unit
+        to_condition = unit.emit(JUMP)
+        body = len(unit)
+        self._block(node.body)
+        unit.patch(to_condition)
+        self._expression(node.condition)
+        unit.emit(JUMP_IF_TRUE, body)
+
+    def _function_definition(self, node):
+        function = node.function
+        unit = CodeUnit(function.name, function.parameters)
+        # Se registra antes de compilar el cuerpo para admitir la recursión
+        self._function_ids[function.name] = len(self.functions)
+        self.functions.append(unit)
+
+        outer, self._unit = self._unit, unit
+        try:
+            self._block(node.body)
+            self._expression(node.result)
+            self._convert(node.result, function.return_type)
+            unit.emit(RETURN)
+        finally:
+            self._unit = outer
+
+    def _type_definition(self, node):
+        # Los registros se crean a partir de la tabla de registros
+        pass
+
+    # ——— Expresiones —————————————————————————————————————————
+
+    def _expression(self, node):
+        self._expressions[type(node)](node)
+
+    def _literal(self, node):
+        self._unit.emit(CONST, self._unit.constant(literal_value(node)))
+
+    def _reference(self, node):
+        self._unit.emit(LOAD, self._unit.slot(node.name))
+        for access in node.ref_chain:
+            self._access(access)
+
+    def _binary(self, node):
+        unit = self._unit
+        if node.op in ("and", "or"):
+            # En cortocircuito: si el izquierdo decide, queda como resultado
+            self._expression(node.left)
+            jump = unit.emit(
+                JUMP_IF_FALSE_OR_POP if node.op == "and" else JUMP_IF_TRUE_OR_POP
+            )
+            self._expression(node.right)
+            unit.patch(jump)
+            return
+
+        numeric = node.op in ARITHMETIC + MULTIPLICATIVE
+        left, right = static_type(node.left), static_type(node.right)
+        self._expression(node.left)
+        if numeric and left is CHAR:
+            unit.emit(ORD)
+        unit.emit(BINARY_OPCODES[node.op], self._operand(node.right, numeric))
+        # * da siempre float, aunque los operandos sean enteros
+        if node.op == "*" and FLOAT not in (left, right):
+            unit.emit(TO_FLOAT)
+
+    def _unary(self, node):
+        self._expression(node.expr)
+        if node.op == "-":
+            self._unit.emit(NEG)
+        elif node.op == "not":
+            self._unit.emit(NOT)
+
+    def _call(self, node):
+        index = self._function_ids[node.name]
+        for parameter, argument in zip(self.functions[index].parameters, node.args):
+            self._expression(argument)
+            self._convert(argument, parameter.datatype)
+        self._unit.emit(CALL, index)
+
+    # ——— Auxiliares ——————————————————————————————————————————
+
+    def _access(self, access):
+        """Acceso a un atributo o elemento del valor que hay en la pila"""
+        kind, payload = access
+        if kind == "field":
+            self._unit.emit(FIELD, self._unit.constant(payload))
+        else:
+            self._unit.emit(INDEX, self._operand(payload, numeric=True))
+
+    def _operand(self, node, numeric=False):
+        """
+        Prepara el operando derecho de una instrucción binaria y devuelve su
+        codificación (ver BINARY_END): los literales y las variables sin
+        accesos no se apilan. Con numeric, un char se usa por su código.
+        """
+        unit = self._unit
+        char = numeric and static_type(node) is CHAR
+        if isinstance(node, Literal):
+            value = literal_value(node)
+            return unit.constant(ord(value) if char else value) + 1
+        if isinstance(node, VariableRef) and not node.ref_chain and not char:
+            return -(unit.slot(node.name) + 1)
+        self._expression(node)
+        if char:
+            unit.emit(ORD)
+        return 0
+
+    def _convert(self, node, datatype):
+        """Conversión del valor de node (en la pila) al guardarlo en una
+        variable de tipo datatype, como interpreter.convert"""
+        unit = self._unit
+        source = static_type(node)
+        if is_aggregate(node) or source not in PRIMITIVES or datatype not in PRIMITIVES:
+            # Registros y vectores se copian
+            unit.emit(CONVERT, unit.constant(datatype))
+        elif source is datatype:
+            pass
+        elif datatype is FLOAT and source is INT:
+            unit.emit(TO_FLOAT)
+        elif datatype is INT and source is CHAR:
+            unit.emit(ORD)
+        else:
+            unit.emit(CONVERT, unit.constant(datatype))
+
+    def _zero(self, variable):
+        """Deja en la pila el valor inicial de una variable sin valor"""
+        unit = self._unit
+        if isinstance(variable, Vector):
+            self._expression(variable.length)
+            if static_type(variable.length) is CHAR:
+                unit.emit(ORD)
+            unit.emit(NEW_VECTOR, unit.constant(variable.datatype))
+        elif variable.datatype in ZEROS:
+            unit.emit(CONST, unit.constant(ZEROS[variable.datatype]))
+        else:
+            unit.emit(NEW_RECORD, unit.constant(variable.datatype))
+
+
+def disassemble(unit):
+    """Texto legible del bytecode de un CodeUnit (para depurar)"""
+    lines = []
+    for position in range(0, len(unit.code), 2):
+        opcode, operand = unit.code[position], unit.code[position + 1]
+        text = f"{position:5} {OPCODES[opcode]:<22}"
+        if opcode < BINARY_END:
+            if operand > 0:
+                text += f"const {unit.constants[operand - 1]!r}"
+            elif operand < 0:
+                text += f"slot {~operand} ({unit.names[~operand]})"
+        elif opcode in (LOAD, STORE):
+            text += f"{operand} ({unit.names[operand]})"
+        elif opcode in (CONST, FIELD, STORE_FIELD, CONVERT, NEW_VECTOR, NEW_RECORD):
+            text += f"{operand} ({unit.constants[operand]!r})"
+        elif opcode in JUMPS or opcode == CALL:
+            text += f"{operand}"
+        lines.append(text.rstrip())
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python3 bytecode.py <file.vip>")
+        exit(1)
+
+    parsed = parse_program(sys.argv[1])
+    if parsed is None:
+        exit(1)
+    compiler = Compiler()
+    main = compiler.compile(parsed[0])
+    for unit in compiler.functions + [main]:
+        print(f"{unit.name}:")
+        print(disassemble(unit))
+        print()
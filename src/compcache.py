@@ -0,0 +1,126 @@
+# compcache.py
+# Caché incremental de compilación: si un fichero .vip (y todo lo que incluye
+# con %append) no ha cambiado, se restauran sus artefactos sin ejecutar PLY.
+import glob
+import hashlib
+import json
+import os
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Directorio por defecto de la caché y tamaño máximo que puede ocupar
+CACHE_DIR = os.path.join(SRC_DIR, "build_cache")
+MAX_CACHE_SIZE = 64 * 1024 * 1024
+
+# Extensiones de los artefactos que se guardan para cada fichero
+ARTEFACTS = ("token", "symbol", "record", "error")
+
+
+def compiler_version():
+    """
+    Hash del código fuente del compilador. Cualquier cambio en él invalida
+    todas las entradas de la caché.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(SRC_DIR, "*.py"))):
+        with open(path, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+class CompilationCache:
+    """
+    Guarda los artefactos de cada compilación en CACHE_DIR, uno por entrada,
+    indexados por el hash del contenido del fichero, de su cierre de %append
+    y de la versión del compilador.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_size=MAX_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.version = compiler_version()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(
+        self,
+        route,
+        dependencies=(),
+        preprocess=False,
+        diagnostics_format="text",
+        max_errors=None,
+    ):
+        """
+        Clave de caché de route y los ficheros que incluye. También entran las
+        opciones que cambian los artefactos: el formato y el máximo de errores
+        cambian el .error.
+        """
+        options = f"{self.version}:{preprocess}:{diagnostics_format}:{max_errors}"
+        digest = hashlib.sha256(options.encode())
+        for path in [route, *dependencies]:
+            # La ruta de los incluidos importa: cambia a qué fichero apunta %append
+            if path != route:
+                digest.update(path.encode())
+            with open(path, "rb") as file:
+                digest.update(hashlib.sha256(file.read()).digest())
+        return digest.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def restore(self, key, outputs):
+        """
+        Si key está en la caché, escribe cada artefacto en su ruta de outputs
+        (extensión -> ruta) y devuelve el contenido del .error. Si no, None.
+        """
+        entry = self._entry(key)
+        try:
+            with open(entry, "r") as file:
+                artefacts = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+
+        for extension, path in outputs.items():
+            with open(path, "w") as file:
+                file.write(artefacts[extension])
+        # Se actualiza la fecha para que la expulsión sea por uso (LRU)
+        os.utime(entry)
+        self.hits += 1
+        return artefacts["error"]
+
+    def store(self, key, outputs):
+        """Guarda en la caché los artefactos ya escritos en outputs."""
+        artefacts = {}
+        for extension, path in outputs.items():
+            with open(path, "r") as file:
+                artefacts[extension] = file.read()
+
+        # Escritura atómica: varios procesos pueden compartir la caché
+        entry = self._entry(key)
+        with open(f"{entry}.{os.getpid()}.tmp", "w") as file:
+            json.dump(artefacts, file)
+        os.replace(f"{entry}.{os.getpid()}.tmp", entry)
+
+    def evict(self):
+        """Borra las entradas menos usadas hasta no superar max_size."""
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            os.remove(path)
+            total -= size
+            self.evictions += 1
+
+    def __str__(self):
+        return (
+            f"Caché: {self.hits} aciertos, {self.misses} fallos, "
+            f"{self.evictions} expulsadas"
+        )
@@ -0,0 +1,119 @@
+# datatypes.py
+# Modelo de tipos del compilador. Cada tipo se crea una sola vez (está
+# internado), así que dos tipos son iguales si y solo si son el mismo objeto:
+# se comparan con `is` y se usan como claves de diccionario por identidad.
+# str() de un tipo es su nombre en Viper, el mismo texto que aparece en los
+# .symbol, .record y mensajes de error.
+from itertools import count
+
+# Tipos ya creados: (clase, clave) -> Type
+_interned = {}
+_ids = count(1)
+
+
+class Type:
+    """
+    Tipo internado. id es un entero pequeño distinto para cada tipo; los
+    tipos básicos tienen los primeros, de modo que sirven de índice en las
+    tablas de typerules.
+    """
+
+    __slots__ = ("name", "id")
+
+    def __init__(self, name):
+        self.name = name
+        self.id = next(_ids)
+
+    @classmethod
+    def _intern(cls, key, *args):
+        datatype = _interned.get((cls, key))
+        if datatype is None:
+            datatype = _interned[(cls, key)] = cls(*args)
+        return datatype
+
+    def __str__(self):
+        return self.name
+
+    __repr__ = __str__
+
+
+class PrimitiveType(Type):
+    __slots__ = ()
+
+
+class RecordType(Type):
+    """Tipo definido con `type`. Existe aunque el registro no esté definido:
+    si lo está se comprueba en la tabla de registros."""
+
+    __slots__ = ()
+
+
+class VectorType(Type):
+    """Vector de element con length elementos (None si no se conoce)"""
+
+    __slots__ = ("element", "length")
+
+    def __init__(self, element, length):
+        super().__init__(f"{element}[{length if length is not None else ''}]")
+        self.element = element
+        self.length = length
+
+
+class FunctionType(Type):
+    """Firma de una función: tipos de los parámetros y tipo de retorno"""
+
+    __slots__ = ("parameters", "result")
+
+    def __init__(self, parameters, result):
+        super().__init__(f"({', '.join(map(str, parameters))}) -> {result}")
+        self.parameters = parameters
+        self.result = result
+
+
+def _primitive(name):
+    return PrimitiveType._intern(name, name)
+
+
+INT = _primitive("int")
+FLOAT = _primitive("float")
+CHAR = _primitive("char")
+BOOL = _primitive("bool")
+PRIMITIVES = (INT, FLOAT, CHAR, BOOL)
+
+# Tipo de retorno de las funciones declaradas con un tipo que no existe
+NONE = _primitive("NoneType")
+
+_PRIMITIVE_NAMES = {datatype.name: datatype for datatype in PRIMITIVES}
+
+
+def record_type(name):
+    return RecordType._intern(name, name)
+
+
+def named_type(name):
+    """Tipo con ese nombre en el código: uno básico o un registro"""
+    datatype = _PRIMITIVE_NAMES.get(name)
+    return datatype if datatype is not None else record_type(name)
+
+
+def vector_type(element, length=None):
+    return VectorType._intern((element, length), element, length)
+
+
+def function_type(parameters, result):
+    parameters = tuple(parameters)
+    return FunctionType._intern((parameters, result), parameters, result)
+
+
+def release_composites():
+    """
+    Olvida los tipos internados que no son básicos (registros, vectores y
+    funciones) y vuelve a numerar desde el último básico. Se llama al empezar
+    cada compilación, para que en modo batch no se acumulen los tipos de
+    todos los ficheros.
+    """
+    global _ids
+    for key, datatype in list(_interned.items()):
+        if not isinstance(datatype, PrimitiveType):
+            del _interned[key]
+    _ids = count(max(datatype.id for datatype in _interned.values()) + 1)
@@ -0,0 +1,431 @@
+# diagnostics.py
+# Diagnósticos del compilador. Los errores léxicos, sintácticos y semánticos
+# se guardan como registros en un colector y se muestran todos juntos al
+# terminar, como texto (el formato de siempre) o como JSON.
+import json
+from enum import Enum
+
+from datatypes import Type
+
+
+class ErrorCode(Enum):
+    """Códigos de error. El valor es el nombre con el que se conocía cada uno."""
+
+    # Léxicos y sintácticos
+    ILLEGAL_CHARACTER = "Illegal Character"
+    SYNTAX_ERROR = "Syntax Error"
+    UNEXPECTED_EOF = "Unexpected EOF"
+
+    # Semánticos
+    FUNCTION_DECLARATION = "Function Declaration Error"
+    FUNCTION_PARAMETER_TYPE = "Function Declaration Type Atribute Error"
+    FUNCTION_TYPE = "Function Type Declaration Error"
+    FUNCTION_VARIABLE_TYPE = "Type Variable Declaration Error Function"
+    FUNCTION_REDEFINITION = "Function Redefinition"
+    TYPE_DECLARATION = "Type Declaration Error"
+    INCOMPATIBLE_TYPES = "Incompatible Types"
+    INCOMPATIBLE_TYPES_FUNC = "Incompatible Types Func"
+    INCOMPATIBLE_RETURN = "Incompatible Types Func Ret"
+    INCOMPATIBLE_ASSIGNMENT = "Incompatible Types Assignment"
+    INCOMPATIBLE_ASSIGNMENT_FUNC = "Incompatible Types Assignment Function"
+    DECLARATION = "Declaration Error"
+    VARIABLE_NOT_FOUND = "Variable not found"
+    VARIABLE_NOT_FOUND_FUNC = "Variable not found Function"
+    ATTRIBUTE_NOT_DEFINED = "Type Error Not defined"
+    INCOMPATIBLE_OPERANDS = "Incompatible Operands"
+    VARIABLE_REDEFINITION = "Redefinition of Variable"
+    VARIABLE_REDEFINITION_FUNC = "Redefinition of Variable FUNC"
+    TYPE_REDEFINITION = "Type Redefinition Error"
+    ATTRIBUTE_REDECLARATION = "Redeclaration of Type Attr"
+    NO_ATTRIBUTE = "Attribute of type"
+    NOT_A_VECTOR = "No Vector Error"
+    VECTOR_LENGTH = "Vector length error"
+    MISSING_VECTOR_INDEX = "No Vector DEC Error"
+    FUNCTION_NOT_FOUND = "Function not found"
+    FUNCTION_NOT_FOUND_FUNC = "Function not found FUNC"
+    PARAMETER_COUNT = "Function parameters mismatch"
+    PARAMETER_COUNT_FUNC = "Function parameters mismatch FUNC"
+    PARAMETER_TYPE = "Function error parameter"
+    PARAMETER_TYPE_FUNC = "Function error parameter FUNC"
+    IF_CONDITION = "IF COND ERROR"
+    IF_CONDITION_FUNC = "IF COND ERROR FUNC"
+    WHILE_CONDITION = "WHILE COND ERROR"
+    WHILE_CONDITION_FUNC = "WHILE COND ERROR FUNC"
+
+
+def _type(datatype):
+    return str(datatype).upper() if datatype != None else "NONETYPE"
+
+
+def _type_name(datatype):
+    return str(datatype) if datatype != None else "NONETYPE"
+
+
+def _names(variables):
+    return ", ".join(var.name for var in variables)
+
+
+def _illegal_character(args):
+    char, line, path = args
+    if path is not None:
+        return [f"Caracter ilegal '{char}' en la línea {line} de {path}"]
+    return [f"Caracter ilegal '{char}' en la línea {line}"]
+
+
+def _incompatible_assignment(args):
+    if args[1] is None:
+        return ["\tDETECTED IN ASSIGNMENT", f"\tVariable affected: {args[2]}", ""]
+    return [
+        "SEMANTIC ERROR DETECTED IN ASSIGNMENT:",
+        f"\tIncompatible types: {_type(args[0])} and {_type(args[1])}",
+        f"\tVariable affected: {args[2]}",
+        "",
+    ]
+
+
+def _condition(statement, in_function):
+    """Formateador de una condición no booleana de un if o un while"""
+    header = f"SEMANTIC ERROR DETECTED IN {statement} STATEMENT:"
+    if in_function:
+        return lambda args: [
+            header,
+            f"\tExpected a boolean value for the condition, got {args[0]}",
+            f"\tFunction Scope referece: {args[1]}",
+            "",
+        ]
+    return lambda args: [
+        header,
+        f"\tExpected a boolean value for the condition, got {args[0]} instead",
+        "",
+    ]
+
+
+# Cada formateador recibe los argumentos del error y devuelve sus líneas. Se
+# llaman al mostrar los errores, así que no deben volver a inferir nada; los
+# nodos y símbolos de los argumentos llegan como Snapshot (ver snapshot).
+FORMATTERS = {
+    ErrorCode.ILLEGAL_CHARACTER: _illegal_character,
+    ErrorCode.SYNTAX_ERROR: lambda args: [
+        "Error sintáctico en línea:",
+        f">>> {args[0]}",
+        f"    {' ' * args[1]}^",
+    ],
+    ErrorCode.UNEXPECTED_EOF: lambda args: ["Error sintáctico al final del archivo."],
+    ErrorCode.FUNCTION_DECLARATION: lambda args: [
+        "SEMANTIC ERROR DETECTED IN FUNCTION ATRIBUTES DEFINITION:",
+        "\tYou cannot assign a value to a function atribute type.",
+        f"\tVariables Affected: {_names(args[1])}",
+        f"\tFunction declaration affected: {args[0]}",
+        "",
+    ],
+    ErrorCode.FUNCTION_PARAMETER_TYPE: lambda args: [
+        "SEMANTIC ERROR DETECTED IN FUNCTION ATRIBUTES TYPE DEFINITION:",
+        f"\t DATATYPE {args[1]} is not defined for variables:",
+        f"\t\t-{"\n\t\t-".join(var.name for var in args[2])}",
+        f"\t Function affected: {args[0]}",
+        "",
+    ],
+    ErrorCode.FUNCTION_TYPE: lambda args: [
+        "SEMANTIC ERROR DETECTED IN FUNCTION TYPE DEFINITION:",
+        f"\t DATATYPE {args[1]} is not defined",
+        f"\t Function affected: {args[0]}",
+        "",
+    ],
+    ErrorCode.FUNCTION_VARIABLE_TYPE: lambda args: [
+        "SEMANTIC ERROR DETECTED IN FUNCTION VARIABLE DEFINITION:",
+        f"\tDATATYPE {args[0]} is not defined for variable: {args[1]}",
+        f"\tFunction affected: {args[2]}",
+        "",
+    ],
+    ErrorCode.FUNCTION_REDEFINITION: lambda args: [
+        "SEMANTIC ERROR DETECTED",
+        f"\tFUNCTION '{args[0]}' IS ALREADY DEFINED",
+        "",
+    ],
+    ErrorCode.TYPE_DECLARATION: lambda args: [
+        "SEMANTIC ERROR DETECTED IN TYPE DECLARATION:",
+        "\tYou cannot assign a value to a record type.",
+        f"\tRecords Affected: {_names(args)}",
+        "",
+    ],
+    ErrorCode.INCOMPATIBLE_TYPES: lambda args: [
+        "SEMANTIC ERROR DETECTED IN DECLARATION AND ASSIGNEMENT:",
+        f"\tIncompatible types: {_type(args[0])} and {_type(args[1])}",
+        f"\tVariables Affected: {_names(args[2])}",
+        "",
+    ],
+    ErrorCode.INCOMPATIBLE_TYPES_FUNC: lambda args: [
+        "SEMANTIC ERROR DETECTED IN DECLARATION AND ASSIGNEMENT INSIDE FUNCTION:",
+        f"\tIncompatible types: {_type(args[0])} and {_type(args[1])}",
+        f"\tVariables Affected: {_names(args[2])}",
+        f"\tFunction Affected: {args[3]}",
+        "",
+    ],
+    ErrorCode.INCOMPATIBLE_RETURN: lambda args: [
+        "SEMANTIC ERROR DETECTED IN RETURN STATEMENT:",
+        f"\tIncompatible types: {_type(args[0])} and {_type(args[1])}",
+        f"\tFunction Affected: {args[2]}",
+        "",
+    ],
+    ErrorCode.INCOMPATIBLE_ASSIGNMENT: _incompatible_assignment,
+    ErrorCode.INCOMPATIBLE_ASSIGNMENT_FUNC: lambda args: [
+        "SEMANTIC ERROR DETECTED IN ASSIGNMENT INSIDE FUNCTION:",
+        f"\tIncompatible types: {_type(args[0])} and {_type(args[1])}",
+        f"\tVariable affected: {args[2]}",
+        f"\tFunction Affected: {args[3]}",
+        "",
+    ],
+    ErrorCode.DECLARATION: lambda args: [
+        "SEMANTIC ERROR DETECTED IN DECLARATION:",
+        f"\tRecord {args[0]} not found.",
+        f"\tVariables Affected: {_names(args[1])}",
+        "",
+    ],
+    ErrorCode.VARIABLE_NOT_FOUND: lambda args: [
+        "SEMANTIC ERROR DETECTED IN ASSIGNMENT:",
+        f"\tVariable '{args}' not found or out of scope",
+        "",
+    ],
+    ErrorCode.VARIABLE_NOT_FOUND_FUNC: lambda args: [
+        "SEMANTIC ERROR DETECTED IN ASSIGNMENT:",
+        f"\tVariable '{args[0]}' not found or out of scope",
+        f"\tFunction Affected: {args[1]}",
+        "",
+    ],
+    ErrorCode.ATTRIBUTE_NOT_DEFINED: lambda args: [
+        "SEMANTIC ERROR DETECTED IN ASSIGNMENT:",
+        f"\tInvalid assignment to variable '{args[0]}'. Attribute: {args[1]} is not defined",
+        "",
+    ],
+    ErrorCode.INCOMPATIBLE_OPERANDS: lambda args: [
+        "SEMANTIC ERROR DETECTED IN OPERATOR EXPRESSION:",
+        f"\tIncompatible operands: {args[1].value} and {args[2].value} for operator {args[0]}. (Are they assigned?)",
+        "",
+    ],
+    ErrorCode.VARIABLE_REDEFINITION: lambda args: [
+        "SEMANTIC ERROR DETECTED. REDECLARATION OF VARIABLE:",
+        f"\tVariable {args[0]} is already declared in this scope",
+        "",
+    ],
+    ErrorCode.VARIABLE_REDEFINITION_FUNC: lambda args: [
+        "SEMANTIC ERROR DETECTED IN FUNCTION BODY->REDECLARATION OF VARIABLE:",
+        f"\tVariable {args[0]} is already declared in this scope",
+        f"\tFunction Affected: {args[1]}",
+        "",
+    ],
+    ErrorCode.TYPE_REDEFINITION: lambda args: [
+        "SEMANTIC ERROR DETECTED IN TYPE DECLARATION:",
+        f"\ttype '{args[0]}' is already defined",
+        "",
+    ],
+    ErrorCode.ATTRIBUTE_REDECLARATION: lambda args: [
+        "SEMANTIC ERROR DETECTED IN TYPE DECLARATION:",
+        f"\ttype '{args[1]}' already has an attribute '{args[0]}'",
+        "",
+    ],
+    ErrorCode.NO_ATTRIBUTE: lambda args: [
+        "SEMANTIC ERROR DETECTED IN TYPE REFERENCE:",
+        f"\ttype '{args[0]}' OBJECT has no attribute '{args[1]}'",
+        "",
+    ],
+    ErrorCode.NOT_A_VECTOR: lambda args: [
+        "SEMANTIC ERROR DETECTED IN VECTOR REFERENCE:",
+        f"\tAttribute '{args[0]}' is not a vector",
+        f"\tVariable affected: {args[1]}",
+        "",
+    ],
+    ErrorCode.VECTOR_LENGTH: lambda args: [
+        "SEMANTIC ERROR DETECTED IN VECTOR LENGTH:",
+        f"\tCannot assign type {args[1]} to vector length",
+        f"\tVariable affected: {args[0]}",
+        "",
+    ],
+    ErrorCode.MISSING_VECTOR_INDEX: lambda args: [
+        "SEMANTIC ERROR DETECTED IN VECTOR:",
+        f"\tMissing index for vector {args[0]}",
+        f"\tVariable affected: {args[1]}",
+        "",
+    ],
+    ErrorCode.FUNCTION_NOT_FOUND: lambda args: [
+        "SEMANTIC ERROR DETECTED IN FUNCTION CALL:",
+        f"\tFunction '{args[0]}' not found",
+        "",
+    ],
+    ErrorCode.FUNCTION_NOT_FOUND_FUNC: lambda args: [
+        "SEMANTIC ERROR DETECTED IN FUNCTION CALL:",
+        f"\tFunction '{args[0]}' not found",
+        f"\tFunction Scope referece: {args[1]}",
+        "",
+    ],
+    ErrorCode.PARAMETER_COUNT: lambda args: [
+        "SEMANTIC ERROR DETECTED IN FUNCTION CALL:",
+        f"\tFunction '{args[0]}' takes {len(args[2])} parameters, but {len(args[1])} were provided",
+        f"\tVariables affected: {args[1]}",
+        "",
+    ],
+    ErrorCode.PARAMETER_COUNT_FUNC: lambda args: [
+        "SEMANTIC ERROR DETECTED IN FUNCTION CALL:",
+        f"\tFunction '{args[0]}' takes {len(args[2])} parameters, but {len(args[1])} were provided",
+        f"\tVariables affected: {args[1]}",
+        f"\tFunction Scope referece: {args[3]}",
+        "",
+    ],
+    ErrorCode.PARAMETER_TYPE: lambda args: [
+        "SEMANTIC ERROR DETECTED IN FUNCTION CALL:",
+        f"\tIncompatible Datatypes. Expected: {_type_name(args[1].datatype)} and provided: {_type_name(args[0].datatype)}",
+        f"\tFunction Call affected: {args[2]}",
+        "",
+    ],
+    ErrorCode.PARAMETER_TYPE_FUNC: lambda args: [
+        "SEMANTIC ERROR DETECTED IN FUNCTION CALL:",
+        f"\tIncompatible Datatypes. Expected: {_type_name(args[1].datatype)} and provided: {_type_name(args[0].datatype)}",
+        f"\tFunction Call affected: {args[2]}",
+        f"\tFunction Scope referece: {args[3]}",
+        "",
+    ],
+    ErrorCode.IF_CONDITION: _condition("IF", False),
+    ErrorCode.IF_CONDITION_FUNC: _condition("IF", True),
+    ErrorCode.WHILE_CONDITION: _condition("WHILE", False),
+    ErrorCode.WHILE_CONDITION_FUNC: _condition("WHILE", True),
+}
+
+
+class Snapshot:
+    """
+    Copia de un nodo o símbolo pasado como argumento de un error, tomada al
+    reportarlo: los atributos que leen los formateadores y su texto. Así el
+    mensaje no cambia si el análisis modifica después el símbolo (por
+    ejemplo, su datatype).
+    """
+
+    __slots__ = ("name", "value", "datatype", "_str", "_repr")
+
+    def __init__(self, node):
+        self.name = getattr(node, "name", None)
+        self.value = snapshot(getattr(node, "value", None))
+        self.datatype = getattr(node, "datatype", None)
+        if self.datatype is None:
+            # Operaciones: no guardan su tipo, pero ya se ha inferido
+            self.datatype = getattr(node, "inferred_type", None)
+        self._str = str(node)
+        self._repr = repr(node)
+
+    def __str__(self):
+        return self._str
+
+    def __repr__(self):
+        return self._repr
+
+
+def snapshot(value):
+    """Argumento de un error que no cambia aunque cambie el original"""
+    if value is None or isinstance(value, (str, int, float, Type)):
+        return value
+    if isinstance(value, list):
+        return [snapshot(element) for element in value]
+    if isinstance(value, tuple):
+        return tuple(snapshot(element) for element in value)
+    return Snapshot(value)
+
+
+class Diagnostic:
+    """
+    Un error reportado: su código, sus argumentos (ver snapshot) y dónde se
+    produjo. El mensaje no se formatea hasta que se pide (al mostrarlo), de
+    modo que los errores que se descartan no cuestan nada más que guardar sus
+    argumentos.
+    """
+
+    __slots__ = ("code", "args", "location", "_lines")
+
+    def __init__(self, code, args=(), location=None):
+        self.code = code
+        self.args = args
+        # (fichero, línea, columna) originales, solo con el preprocesador
+        self.location = location
+        self._lines = None
+
+    @property
+    def lines(self):
+        """
+        Líneas del mensaje; se formatean la primera vez que se piden. Si el
+        formateador falla se muestra el código con los argumentos, para no
+        perder el resto de errores de la compilación.
+        """
+        if self._lines is None:
+            try:
+                self._lines = FORMATTERS[self.code](self.args)
+            except Exception as error:
+                self._lines = [
+                    f"{self.code.value}: {self.args!r}",
+                    f"\t(no se pudo formatear el mensaje: {error!r})",
+                    "",
+                ]
+        return self._lines
+
+    def text_lines(self):
+        if self.location is None:
+            return self.lines
+        return ["{}, línea {}, columna {}:".format(*self.location), *self.lines]
+
+    def to_dict(self):
+        record = {"code": self.code.name, "message": "\n".join(self.lines).rstrip()}
+        if self.location is not None:
+            record["file"], record["line"], record["column"] = self.location
+        return record
+
+
+class Diagnostics:
+    """
+    Colector de los diagnósticos de una compilación. Cada error se guarda con
+    sus argumentos y render() los formatea y junta todos en un único texto
+    para escribirlo de una vez.
+    Con max_errors se descartan los errores a partir de ese número.
+    """
+
+    FORMATS = ("text", "json")
+
+    def __init__(self, max_errors=None, format="text"):
+        if format not in self.FORMATS:
+            raise ValueError(f"Formato de diagnósticos desconocido: {format}")
+        self.max_errors = max_errors
+        self.format = format
+        self.records = []
+        self.omitted = 0
+
+    def report(self, code, args=(), location=None):
+        """Registra un error con el código y los argumentos de su formateador"""
+        if self.max_errors is not None and len(self.records) >= self.max_errors:
+            self.omitted += 1
+            return None
+        self.records.append(Diagnostic(code, snapshot(args), location))
+        return None
+
+    def clear(self):
+        self.records = []
+        self.omitted = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def render(self):
+        """Todos los diagnósticos en el formato del colector ("" si no hay)"""
+        if not self.records:
+            return ""
+
+        if self.format == "json":
+            document = {
+                "diagnostics": [record.to_dict() for record in self.records],
+                "omitted": self.omitted,
+            }
+            return json.dumps(document, ensure_ascii=False, indent=2) + "\n"
+
+        lines = []
+        for record in self.records:
+            lines.extend(record.text_lines())
+        if self.omitted:
+            lines.append(
+                f"... {self.omitted} errores más (máximo {self.max_errors} errores)"
+            )
+        lines.append("")
+        return "\n".join(lines)
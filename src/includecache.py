@@ -0,0 +1,76 @@
+# includecache.py
+# Caché de la expansión de %append: cada fichero se preprocesa una sola vez
+# por compilación mientras no cambien ni él ni los ficheros que incluye.
+import os
+
+
+def file_stamp(path):
+    """Marca de modificación de path: fecha (en ns) y tamaño"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class IncludeCache:
+    """
+    Guarda la expansión de cada fichero (por ruta absoluta: su contenido ya
+    preprocesado y sus segmentos para el SourceMap) junto con su marca y los
+    ficheros que incluye directamente. Con estos últimos se mantiene el
+    grafo inverso de dependencias: si un fichero cambia se descartan su
+    entrada y las de todos los que lo incluyen, directa o indirectamente, y
+    el resto se sigue reutilizando.
+    """
+
+    def __init__(self):
+        # ruta -> (marca, expansión, rutas incluidas)
+        self._entries = {}
+        # ruta -> rutas que la incluyen con %append
+        self._dependents = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        """Devuelve la expansión de path si sigue vigente, o None"""
+        if not self._fresh(path, set()):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._entries[path][1]
+
+    def put(self, path, stamp, expansion, includes):
+        """
+        Guarda la expansión de path. stamp debe tomarse antes de leer el
+        fichero, para que un cambio durante la lectura no pase inadvertido.
+        """
+        self._entries[path] = (stamp, expansion, tuple(includes))
+        for include in includes:
+            self._dependents.setdefault(include, set()).add(path)
+
+    def invalidate(self, path):
+        """Descarta path y, transitivamente, los ficheros que dependen de él"""
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            for include in entry[2]:
+                self._dependents.get(include, set()).discard(path)
+        for dependent in self._dependents.pop(path, ()):
+            self.invalidate(dependent)
+
+    def _fresh(self, path, checked):
+        """Comprueba path y sus incluidos; invalida lo que haya cambiado"""
+        if path in checked:
+            return True
+        checked.add(path)
+
+        entry = self._entries.get(path)
+        if entry is None:
+            return False
+        try:
+            stamp = file_stamp(path)
+        except OSError:
+            stamp = None
+        if stamp != entry[0]:
+            self.invalidate(path)
+            return False
+        return all(self._fresh(include, checked) for include in entry[2])
+
+    def __str__(self):
+        return f"Includes: {self.hits} aciertos, {self.misses} fallos"
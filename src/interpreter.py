@@ -0,0 +1,362 @@
+# interpreter.py
+# Intérprete de árbol: ejecuta el AST que construye ViperParser
+# (objects.Program) recorriendo sus nodos. Solo se ejecutan programas sin
+# errores, así que se da por hecho que los tipos ya están comprobados.
+# Cada llamada a función abre un marco (dict nombre -> valor) con sus
+# parámetros y variables locales; el marco global tiene las del programa.
+# Los registros se guardan como dict campo -> valor y los vectores como
+# listas; al asignarlos, pasarlos o devolverlos se copian (semántica de valor).
+# Uso: python3 main.py --run <fichero.vip>
+import codecs
+import operator
+import time
+
+from datatypes import BOOL, CHAR, FLOAT, INT
+from exception import ExecutionError
+from objects import (
+    Assignment,
+    BinaryExpr,
+    Declaration,
+    FunctionCall,
+    FunctionDefinition,
+    IfStatement,
+    Literal,
+    TypeDefinition,
+    UnaryExpr,
+    VariableRef,
+    Vector,
+    WhileStatement,
+)
+from typerules import binary_result
+
+# Valor inicial de las variables declaradas sin valor
+ZEROS = {INT: 0, FLOAT: 0.0, CHAR: "\0", BOOL: False}
+
+ARITHMETIC_OPS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+}
+COMPARISONS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    "<": operator.lt,
+    ">=": operator.ge,
+    "<=": operator.le,
+}
+
+
+def runtime_type(value):
+    """Tipo básico de un valor (None para registros y vectores)"""
+    if isinstance(value, bool):
+        return BOOL
+    if isinstance(value, int):
+        return INT
+    if isinstance(value, float):
+        return FLOAT
+    if isinstance(value, str):
+        return CHAR
+    return None
+
+
+def numeric(value):
+    """Valor numérico de un operando: los char valen su código"""
+    return ord(value) if isinstance(value, str) else value
+
+
+def literal_value(literal):
+    """Valor de un Literal: true/false como bool y los char con escape
+    (por ejemplo '\\n') ya convertidos"""
+    value = literal.value
+    if value == "true" or value == "false":
+        return value == "true"
+    if isinstance(value, str) and len(value) == 2 and value[0] == "\\":
+        return codecs.decode(value, "unicode_escape")
+    return value
+
+
+def copy_value(value):
+    """Copia de un registro o vector (los básicos son inmutables)"""
+    if isinstance(value, list):
+        return [copy_value(element) for element in value]
+    if isinstance(value, dict):
+        return {name: copy_value(field) for name, field in value.items()}
+    return value
+
+
+def convert(value, datatype):
+    """Valor que se guarda en una variable de tipo datatype, aplicando las
+    conversiones implícitas de typerules.PROMOTIONS"""
+    if isinstance(value, (list, dict)):
+        return copy_value(value)
+    if datatype is FLOAT:
+        return float(numeric(value))
+    if datatype is INT:
+        return int(numeric(value))
+    if datatype is CHAR and not isinstance(value, str):
+        try:
+            return chr(int(value))
+        except (ValueError, OverflowError):
+            raise ExecutionError(f"{value} no es un código de carácter válido")
+    return value
+
+
+def apply_binary(op, left, right):
+    """Valor de left op right (salvo and/or, que se evalúan en cortocircuito).
+    El tipo del resultado es el que da typerules: * y / siempre dan float"""
+    comparison = COMPARISONS.get(op)
+    if comparison is not None:
+        try:
+            return comparison(left, right)
+        except TypeError:
+            raise ExecutionError(f"Los valores no se pueden comparar con `{op}`")
+
+    result = binary_result(op, runtime_type(left), runtime_type(right))
+    left, right = numeric(left), numeric(right)
+    if op == "/" and right == 0:
+        raise ExecutionError("División por cero")
+    value = ARITHMETIC_OPS[op](left, right)
+    return float(value) if result is FLOAT else value
+
+
+def apply_unary(op, value):
+    if op == "not":
+        return not value
+    return -value if op == "-" else value
+
+
+def zero_value(datatype, records):
+    """Valor inicial de una variable de tipo datatype declarada sin valor.
+    records: tabla de registros, de donde se sacan los campos"""
+    if datatype in ZEROS:
+        return ZEROS[datatype]
+    record = records.lookup(datatype)
+    return {field.name: _field_zero(field, records) for field in record.fields.values()}
+
+
+def _field_zero(field, records):
+    if not isinstance(field, Vector):
+        return zero_value(field.datatype, records)
+    # Los atributos vector se crean con cada registro, sin marco en el que
+    # evaluar la longitud: tiene que ser un literal
+    if not isinstance(field.length, Literal):
+        raise ExecutionError(f"La longitud del atributo `{field.name}` no es constante")
+    length = numeric(literal_value(field.length))
+    return [zero_value(field.datatype, records) for _ in range(length)]
+
+
+def dump_values(values, symbols):
+    """Líneas con el valor final de cada variable global (values: nombre ->
+    valor), en el orden en que están en la tabla de símbolos (el del .symbol)"""
+    return [
+        f"{variable} = {format_value(values[name])}"
+        for name, variable in symbols._variables.items()
+        if name in values
+    ]
+
+
+def format_value(value):
+    """Texto de un valor en la salida del intérprete"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, str):
+        return repr(value)
+    if isinstance(value, list):
+        return f"[{', '.join(map(format_value, value))}]"
+    if isinstance(value, dict):
+        fields = (f"{name}: {format_value(field)}" for name, field in value.items())
+        return f"{{{', '.join(fields)}}}"
+    return str(value)
+
+
+class Interpreter:
+    """
+    Evalúa un objects.Program. records es la tabla de registros del parser,
+    de donde se sacan los campos de cada registro para crearlos.
+    instructions cuenta los nodos ejecutados (sentencias y expresiones) y
+    elapsed el tiempo de la última ejecución, en segundos.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.globals = {}
+        self.functions = {}
+        self.instructions = 0
+        self.elapsed = 0.0
+        # Pila de marcos: el global y uno por cada llamada en curso
+        self._frames = [self.globals]
+        self._dispatch = {
+            Literal: literal_value,
+            VariableRef: self._reference,
+            BinaryExpr: self._binary,
+            UnaryExpr: self._unary,
+            FunctionCall: self._call,
+            Assignment: self._assignment,
+            Declaration: self._declaration,
+            IfStatement: self._if,
+            WhileStatement: self._while,
+            FunctionDefinition: self._function_definition,
+            TypeDefinition: self._type_definition,
+        }
+
+    def run(self, program):
+        """Ejecuta todas las sentencias del programa"""
+        start = time.perf_counter()
+        try:
+            self._block(program.statements)
+        except RecursionError:
+            raise ExecutionError("Demasiadas llamadas anidadas")
+        finally:
+            self.elapsed = time.perf_counter() - start
+
+    def evaluate(self, node):
+        """Ejecuta una sentencia o evalúa una expresión y devuelve su valor"""
+        self.instructions += 1
+        return self._dispatch[type(node)](node)
+
+    def dump(self, symbols):
+        """Líneas con el valor final de cada variable global"""
+        return dump_values(self.globals, symbols)
+
+    def rate(self):
+        """Instrucciones por segundo de la última ejecución"""
+        return self.instructions / self.elapsed if self.elapsed else 0.0
+
+    # ——— Sentencias ——————————————————————————————————————————
+
+    def _block(self, statements):
+        evaluate = self.evaluate
+        for statement in statements:
+            evaluate(statement)
+
+    def _declaration(self, node):
+        frame = self._frames[-1]
+        if node.init is None:
+            for variable in node.variables:
+                frame[variable.name] = self._default(variable)
+            return
+        value = self.evaluate(node.init)
+        for variable in node.variables:
+            frame[variable.name] = convert(value, variable.datatype)
+
+    def _assignment(self, node):
+        target = node.target
+        value = convert(self.evaluate(node.value), target.datatype)
+        container, key = self._frames[-1], target.name
+        for kind, payload in target.ref_chain:
+            container = self._lookup(container, key)
+            key = payload if kind == "field" else self._index(container, payload)
+        container[key] = value
+        # Es el valor de la asignación en cadena que la contenga
+        return value
+
+    def _if(self, node):
+        if self.evaluate(node.condition):
+            self._block(node.body)
+        else:
+            self._block(node.orelse)
+
+    def _while(self, node):
+        while self.evaluate(node.condition):
+            self._block(node.body)
+
+    def _function_definition(self, node):
+        self.functions[node.function.name] = node
+
+    def _type_definition(self, node):
+        # Los campos se toman de la tabla de registros al crear cada uno
+        pass
+
+    # ——— Expresiones —————————————————————————————————————————
+
+    def _reference(self, node):
+        value = self._lookup(self._frames[-1], node.name)
+        for kind, payload in node.ref_chain:
+            value = value[payload if kind == "field" else self._index(value, payload)]
+        return value
+
+    def _binary(self, node):
+        if node.op == "and":
+            return self.evaluate(node.left) and self.evaluate(node.right)
+        if node.op == "or":
+            return self.evaluate(node.left) or self.evaluate(node.right)
+        left, right = self.evaluate(node.left), self.evaluate(node.right)
+        return apply_binary(node.op, left, right)
+
+    def _unary(self, node):
+        return apply_unary(node.op, self.evaluate(node.expr))
+
+    def _call(self, node):
+        definition = self.functions[node.name]
+        function = definition.function
+        frame = {
+            parameter.name: convert(self.evaluate(argument), parameter.datatype)
+            for parameter, argument in zip(function.parameters, node.args)
+        }
+        self._frames.append(frame)
+        try:
+            self._block(definition.body)
+            result = self.evaluate(definition.result)
+        finally:
+            self._frames.pop()
+        return convert(result, function.return_type)
+
+    # ——— Almacenamiento ——————————————————————————————————————
+
+    @staticmethod
+    def _lookup(frame, name):
+        try:
+            return frame[name]
+        except KeyError:
+            # Declarada en una rama que no se ha ejecutado
+            raise ExecutionError(f"La variable `{name}` no tiene valor")
+
+    def _index(self, vector, expression):
+        index = numeric(self.evaluate(expression))
+        if not 0 <= index < len(vector):
+            raise ExecutionError(
+                f"Índice {index} fuera de rango (longitud {len(vector)})"
+            )
+        return index
+
+    def _default(self, variable):
+        """Valor inicial de una variable o atributo declarado sin valor"""
+        if isinstance(variable, Vector):
+            length = numeric(self.evaluate(variable.length))
+            return [zero_value(variable.datatype, self.records) for _ in range(length)]
+        return zero_value(variable.datatype, self.records)
+
+
+def parse_program(route, **lexer_options):
+    """
+    Compila route y devuelve su AST y el ViperParser (con las tablas), o
+    None si tiene errores (ya mostrados).
+    """
+    from lexer import ViperLexer
+    from parser import ViperParser
+
+    viper_lexer = ViperLexer(route, single_pass=True, **lexer_options)
+    viper_lexer.build(optimize=True)
+    viper_lexer.run()
+    viper_parser = ViperParser(viper_lexer)
+    viper_parser.build(optimize=True)
+    program = viper_parser.parse()
+    if program is None or len(viper_parser.diagnostics):
+        return None
+    return program, viper_parser
+
+
+def interpret(route, **lexer_options):
+    """
+    Compila route y, si no tiene errores, lo ejecuta. Devuelve el intérprete
+    y la tabla de símbolos, o None si hubo errores (ya mostrados).
+    """
+    parsed = parse_program(route, **lexer_options)
+    if parsed is None:
+        return None
+    program, viper_parser = parsed
+    interpreter = Interpreter(viper_parser.record_table)
+    interpreter.run(program)
+    return interpreter, viper_parser.symbol_table
@@ -1,23 +1,453 @@
+import io
+import mmap
 import os
+import re
 import shlex
+import sys
+from array import array
+from functools import partial
+from itertools import chain
 import ply.lex as lex
 
+from buildcache import CACHE_DIR, grammar_hash, load_module, table_path
+from diagnostics import Diagnostics, ErrorCode
+from includecache import IncludeCache, file_stamp
+from scanner import FastScanner, comment_end
+from sourcemap import SourceMap
+from tokenfile import BinaryTokenReader, BinaryTokenWriter, Token
+
+# Tamaño de los trozos que se tokenizan en modo streaming y del búfer de
+# escritura del fichero .token
+CHUNK_SIZE = 1 << 20
+WRITE_BUFFER = 1 << 20
+MULTICOMMENT_DELIMITER = b"'''"
+# Lo que TokenStream no puede partir, en el orden de las reglas del lexer:
+# comentarios #, aperturas de comentario multilínea y literales de carácter
+# (t_CHAR sobre los bytes UTF-8: de \x80 a \xff cada carácter ocupa dos)
+UNSPLITTABLE = re.compile(rb"#[^\n]*|'''|'(?:[\x00-\x7f]|[\xc2\xc3][\x80-\xbf]|\\.)'")
+
+# Conversión de los literales numéricos diferidos (ver TokenBuffer.resolve)
+# según su prefijo; el resto de enteros son decimales
+INT_CONVERTERS = {
+    "0x": partial(int, base=16),
+    "0b": partial(int, base=2),
+    "0o": partial(int, base=8),
+}
+
+
+def _trie_pattern(node):
+    """Expresión regular equivalente al trie node (carácter -> subtrie)"""
+    branches = [
+        re.escape(char) + _trie_pattern(child) for char, child in node.items() if char
+    ]
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    # Fin de palabra: el resto es opcional y, al ser voraz, gana la más larga
+    return f"(?:{pattern})?" if "" in node else pattern
+
+
+def supplant_regex(words):
+    """
+    Compila una sola expresión regular que reconoce cualquiera de words.
+    Las palabras se organizan como un trie, así que en cada posición solo se
+    prueba la rama que empieza por el carácter actual (y no todas las
+    palabras) y siempre se elige la coincidencia más larga.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    return re.compile(_trie_pattern(trie))
+
+
+def supplant(content, replacements):
+    """
+    Aplica todas las reglas %supplant (antiguo -> nuevo) en una sola pasada
+    sobre content. El texto sustituido no se vuelve a examinar, de modo que
+    una regla no puede reescribir el resultado de otra.
+    """
+    replacements = {old: new for old, new in replacements.items() if old}
+    if not replacements:
+        return content
+    regex = supplant_regex(replacements)
+    return regex.sub(lambda match: replacements[match.group()], content)
+
+
+def newline_token(lexer, lexpos, lineno):
+    """Crea un token NEWLINE sintético (no procede del fichero)"""
+    token = Token()
+    token.type = "NEWLINE"
+    token.value = "nl"
+    token.lineno = lineno
+    token.lexpos = lexpos
+    token.lexer = lexer
+    return token
+
+
+class TokenBuffer:
+    """
+    Fuente de tokens ya generados para el parser. Expone la misma interfaz
+    que el lexer de PLY (input/token), de modo que yacc.parse consuma los
+    tokens producidos en ViperLexer.run() sin volver a analizar el fichero.
+
+    Los tokens no se guardan como objetos sino en arrays paralelos (id de
+    tipo, índice de valor, línea y posición); los valores se internan en una
+    tabla, así que cada identificador repetido se guarda una sola vez. El
+    Token que recibe el parser se construye al pedirlo.
+
+    Si el lexer entrega los INT y FLOAT sin convertir (deferred_literals en
+    ViperLexer), en la tabla se guarda su texto y se apunta como pendiente.
+    Al acceder a los valores se convierten todos de una vez, agrupados por
+    base, y cada literal distinto una sola vez.
+    """
+
+    def __init__(self, lexer, content):
+        self.lexer = lexer
+        self._index = 0
+
+        self._types = array("B")
+        self._values = array("I")
+        self._lines = array("I")
+        self._positions = array("Q")
+        self._type_names = []
+        self._type_ids = {}
+        self._value_table = []
+        self._value_ids = {}
+        # Literales sin convertir: tipo de token -> índices en _value_table
+        self._pending = {}
+
+        # El parser siempre ha recibido la entrada rodeada de saltos de línea,
+        # así que añadimos esos NEWLINE sintéticos alrededor de los tokens reales
+        # (no aparecen en el fichero .token).
+        self._leading_newline = not content.startswith("\n")
+        self._trailing_newline = not content.endswith("\n")
+        self._end = len(content)
+
+    def append(self, token):
+        """Añade un token producido por el lexer de PLY"""
+        type_id = self._type_ids.get(token.type)
+        if type_id is None:
+            type_id = self._type_ids[token.type] = len(self._type_names)
+            self._type_names.append(token.type)
+
+        value = token.value
+        if isinstance(value, str):
+            if token.type in ("INT", "FLOAT"):
+                # Literal diferido: la clave no choca con la del CHAR '1'
+                key = (token.type, value)
+            else:
+                value = sys.intern(value)
+                key = (str, value)
+        else:
+            # El tipo forma parte de la clave: 1 y 1.0 son valores distintos
+            key = (type(value), value)
+        value_id = self._value_ids.get(key)
+        if value_id is None:
+            value_id = self._value_ids[key] = len(self._value_table)
+            self._value_table.append(value)
+            if isinstance(key[0], str):
+                self._pending.setdefault(token.type, []).append(value_id)
+
+        self._types.append(type_id)
+        self._values.append(value_id)
+        self._lines.append(token.lineno)
+        self._positions.append(token.lexpos)
+
+    def resolve(self):
+        """Convierte en bloque los literales numéricos pendientes"""
+        table = self._value_table
+        groups = {}
+        for value_id in self._pending.pop("INT", ()):
+            converter = INT_CONVERTERS.get(table[value_id][:2], int)
+            groups.setdefault(converter, []).append(value_id)
+        groups[float] = self._pending.pop("FLOAT", [])
+
+        for converter, value_ids in groups.items():
+            texts = [table[value_id] for value_id in value_ids]
+            for value_id, value in zip(value_ids, map(converter, texts)):
+                table[value_id] = value
+
+    def write_text(self, file):
+        """Escribe los tokens (sin los NEWLINE sintéticos) en formato .token"""
+        if self._pending:
+            self.resolve()
+        names, table = self._type_names, self._value_table
+        file.writelines(
+            f"{names[type_id]} {table[value_id]}\n"
+            for type_id, value_id in zip(self._types, self._values)
+        )
+
+    def __len__(self):
+        return len(self._types)
+
+    def __iter__(self):
+        """Recorre los tokens del fichero (sin los NEWLINE sintéticos)"""
+        for index in range(len(self._types)):
+            yield self._token(index)
+
+    def input(self, data):
+        # Los tokens ya están generados; se ignora la entrada
+        self._index = 0
+
+    def token(self):
+        index = self._index - self._leading_newline
+        self._index += 1
+
+        if index == -1:
+            return newline_token(self.lexer, 0, 1)
+        if index < len(self._types):
+            return self._token(index)
+        if index == len(self._types) and self._trailing_newline:
+            return newline_token(self.lexer, self._end, self.lexer.lineno)
+        return None
+
+    def _token(self, index):
+        if self._pending:
+            self.resolve()
+        token = Token()
+        token.type = self._type_names[self._types[index]]
+        token.value = self._value_table[self._values[index]]
+        token.lineno = self._lines[index]
+        token.lexpos = self._positions[index]
+        token.lexer = self.lexer
+        return token
+
+
+class StreamChunk:
+    """
+    Trozo de la entrada de un TokenStream. Hace de lexer de sus tokens en
+    los mensajes de error: lexdata es su texto y lexoffset la posición (en
+    caracteres) en la que empieza dentro de la entrada. Los trozos se cortan
+    justo antes de un salto de línea, así que lexdata empieza con la última
+    línea del trozo anterior: la del salto que la termina (un NEWLINE de
+    este trozo).
+    """
+
+    __slots__ = ("lexdata", "lexoffset")
+
+    def __init__(self, lexdata, lexoffset):
+        self.lexdata = lexdata
+        self.lexoffset = lexoffset
+
+
+class TokenStream:
+    """
+    Fuente de tokens perezosa para ficheros muy grandes. El fichero se
+    proyecta en memoria con mmap y se tokeniza por trozos de CHUNK_SIZE bytes
+    a medida que el parser pide tokens; cada token se escribe a la vez en el
+    .token. Así la memoria usada no depende del tamaño de la entrada.
+    Las posiciones (lexpos) de los tokens son absolutas, como en TokenBuffer,
+    y su lexer es el StreamChunk del que salen.
+    La entrada también puede ser un bytes ya en memoria (el preprocesado).
+    """
+
+    def __init__(
+        self, lexer, source, output_file, binary=None, chunk_size=CHUNK_SIZE
+    ):
+        self.lexer = lexer
+        self._chunk_size = chunk_size
+        self._binary = binary
+        if isinstance(source, bytes):
+            self._file, self._data = None, source
+        else:
+            # El fichero de entrada se abre ya para que un error de lectura
+            # salte en run()
+            self._file = open(source, "rb")
+        self._output = open(output_file, "w", buffering=WRITE_BUFFER)
+        self._tokens = self._generate()
+
+    def input(self, data):
+        # Los tokens se leen del fichero; se ignora la entrada
+        pass
+
+    def token(self):
+        return next(self._tokens, None)
+
+    def close(self):
+        """
+        Escribe los tokens que el parser no haya llegado a pedir y cierra el
+        .token
+        """
+        for _ in self._tokens:
+            pass
+        self._output.close()
+
+    def _generate(self):
+        if self._file is None:
+            yield from self._tokenize(self._data)
+            return
+
+        with self._file as file:
+            size = os.fstat(file.fileno()).st_size
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+            yield from self._tokenize(data)
+
+    def _tokenize(self, data):
+        chunks = self._chunks(data)
+        text, offset, chunk = next(chunks, ("", 0, StreamChunk("", 0)))
+
+        # Mismos NEWLINE sintéticos que en TokenBuffer
+        if data[:1] != b"\n":
+            yield newline_token(chunk, 0, 1)
+
+        for text, offset, chunk in chain([(text, offset, chunk)], chunks):
+            self.lexer.input(text)
+            for token in iter(self.lexer.token, None):
+                token.lexer = chunk
+                token.lexpos += offset
+                self._output.write(f"{token.type} {token.value}\n")
+                if self._binary is not None:
+                    self._binary.write(token)
+                yield token
+
+        if self._binary is not None:
+            self._binary.close(data[:1] != b"\n", data[-1:] != b"\n")
+        if data[-1:] != b"\n":
+            yield newline_token(chunk, offset + len(text), self.lexer.lineno)
+
+    def _chunks(self, data):
+        """
+        Trozos en los que se tokeniza data: su texto, su posición en la
+        entrada y su StreamChunk
+        """
+        size = len(data)
+        start = offset = 0
+        previous = ""
+        while start < size:
+            end = self._chunk_end(data, start, size)
+            text = data[start:end].decode("utf-8")
+            # Última línea del trozo anterior
+            line = previous[previous.rfind("\n") + 1 :]
+            previous = line + text
+            yield text, offset, StreamChunk(previous, offset - len(line))
+            start, offset = end, offset + len(text)
+
+    def _chunk_end(self, data, start, size):
+        """
+        Fin del trozo que empieza en start: el primer punto de corte desde
+        start + chunk_size. El trozo se recorre saltando comentarios y
+        literales de carácter como hace el lexer, así que nunca se corta
+        dentro de uno (un ''' en un comentario # o en un carácter no abre nada).
+        """
+        target = start + self._chunk_size
+        position = start
+        while True:
+            match = UNSPLITTABLE.search(data, position)
+            limit = size if match is None else match.start()
+            if limit > target:
+                end = self._split_point(data, max(position, target), limit)
+                if end is not None:
+                    return end
+            if match is None:
+                return size
+            position = match.end()
+            if match.group() == MULTICOMMENT_DELIMITER:
+                # Como en t_MULTICOMMENT: sin cierre se lee como el carácter '
+                close = data.find(MULTICOMMENT_DELIMITER, position)
+                if close != -1:
+                    position = close + len(MULTICOMMENT_DELIMITER)
+
+    @staticmethod
+    def _split_point(data, position, limit):
+        """
+        Primera posición de [position, limit) por la que se puede partir la
+        entrada, o None si no hay: justo antes de una secuencia de saltos de
+        línea, para no dividir un NEWLINE. El tramo no tiene comentarios ni
+        literales de carácter (ver _chunk_end).
+        """
+        while True:
+            pos = data.find(b"\n", position, limit)
+            if pos == -1:
+                return None
+            if data[pos - 1 : pos] != b"\n":
+                return pos
+            # Estamos dentro de una secuencia de saltos: saltamos al final
+            while data[pos : pos + 1] == b"\n":
+                pos += 1
+            position = pos
+
 
 class ViperLexer:
-    def __init__(self, route: str, allow_preprocess: bool = False):
+    def __init__(
+        self,
+        route: str,
+        allow_preprocess: bool = False,
+        single_pass: bool = False,
+        streaming: bool = False,
+        chunk_size: int = CHUNK_SIZE,
+        binary_tokens: bool = False,
+        keep_postprocessed: bool = False,
+        max_errors: int = None,
+        diagnostics_format: str = "text",
+        fast_scanner: bool = False,
+        deferred_literals: bool = False,
+    ):
         self.allow_preprocess = allow_preprocess
+        # El contenido preprocesado pasa al parser en memoria; solo se escribe
+        # el .postprocessed (para depurar) si se pide con keep_postprocessed
+        self.keep_postprocessed = keep_postprocessed
         self.lexer = None
+
+        # Con single_pass el fichero se tokeniza una única vez: los tokens se
+        # escriben en el .token y a la vez se guardan en token_buffer, que es
+        # lo que consume el parser en lugar de volver a leer el fichero.
+        self.single_pass = single_pass
+
+        # Con streaming el token_buffer es un TokenStream: el fichero no se
+        # carga entero en memoria y el .token se escribe mientras se parsea.
+        self.streaming = streaming
+        self.chunk_size = chunk_size
+
+        # Con binary_tokens también se escribe el .tokbin (ver tokenfile.py)
+        self.binary_tokens = binary_tokens
+
+        # Con fast_scanner se tokeniza con el escáner escrito a mano
+        # (scanner.py) en lugar de con el lexer de PLY. Los tokens son iguales.
+        self.fast_scanner = fast_scanner
+
+        # Con deferred_literals (y single_pass, sin streaming) los INT y FLOAT
+        # salen del lexer como texto y TokenBuffer los convierte en bloque;
+        # raw_literals indica a las reglas que no conviertan mientras tanto.
+        self.deferred_literals = deferred_literals
+        self.raw_literals = False
+
+        # Expansiones de %append ya calculadas. Se conserva entre reset() para
+        # que las cabeceras compartidas por varios ficheros se expandan una vez.
+        self.include_cache = IncludeCache()
+
+        # Colector de errores de cada compilación, compartido con el parser
+        self.diagnostics = Diagnostics(max_errors, diagnostics_format)
+
+        self.reset(route)
+
+    def reset(self, route: str) -> None:
+        """
+        Prepara el lexer para analizar el fichero de route. Permite reutilizar
+        el mismo lexer ya construido para compilar varios ficheros.
+        """
         self.input_file = route
+        self.token_buffer = None
+        self.diagnostics.clear()
+        # Solo con el preprocesador: el contenido ya preprocesado y el mapa de
+        # sus líneas a las de los ficheros originales
+        self.preprocessed = None
+        self.source_map = None
+        if self.lexer is not None:
+            self.lexer.lineno = 1
 
         # Este será el path al que accederá el parser para analizar el
-        # el código. Si el preprocesador está activado, esta ruta se cambiará
-        # por la del fichero preprocesado para que el parser pueda analizarlo correctamente.
+        # el código. Si el preprocesador está activado, el parser usa en su
+        # lugar el contenido de preprocessed, sin pasar por disco.
         self.parser_input_file = route
 
         if route.endswith(".vip"):
             self.output_file = route.replace(".vip", ".token")
         else:
             self.output_file = route + ".token"
+        self.binary_file = self.output_file.replace(".token", ".tokbin")
         # PEQUEÑA DISTINCION PARA REDIRIGIR LOS .token DE LOS CASOS DE PRUEBA
         if (
             "test_files/valid" in self.output_file
@@ -31,6 +461,7 @@ class ViperLexer:
                 self.output_file = self.output_file.replace(
                     "test_files/invalid", "test_files/outputs"
                 )
+            self.binary_file = self.output_file.replace(".token", ".tokbin")
 
     # Palabras reservadas
     reserved = {
@@ -108,7 +539,8 @@ class ViperLexer:
     # Definición para números en coma flotante (incluye notación científica)
     def t_FLOAT(self, t):
         r"(?:[1-9]\d*|0)\.\d+(?:[eE][+-]?\d+)?|\d+[eE][+-]?\d+"
-        t.value = float(t.value)
+        if not self.raw_literals:
+            t.value = float(t.value)
         return t
 
     def t_INT(self, t):
@@ -119,6 +551,8 @@ class ViperLexer:
         [1-9]\d* |
         0
         """
+        if self.raw_literals:
+            return t
         value = t.value
         if value.startswith("0x"):
             t.value = int(value, 16)
@@ -135,10 +569,18 @@ class ViperLexer:
         r"\#.*"
         pass
 
+    # Solo se reconoce la apertura; el cierre se busca a mano (comment_end).
+    # El comentario termina en el primer ''' que lo cierra.
     def t_MULTICOMMENT(self, token):
-        r"\'\'\'(.|\n)*\'\'\'"
-        token.lexer.lineno += token.value.count("\n")
-        pass
+        r"\'\'\'"
+        lexer = token.lexer
+        end = comment_end(lexer.lexdata, token.lexpos)
+        if end == -1:
+            # Sin cierre: como antes, las comillas se leen como el carácter '
+            token.type, token.value = "CHAR", "'"
+            return token
+        lexer.lineno += lexer.lexdata.count("\n", token.lexpos, end)
+        lexer.lexpos = end
 
     # Carácter: cualquier símbolo ASCII-extendido delimitado por comillas simples
     def t_CHAR(self, t):
@@ -164,56 +606,168 @@ class ViperLexer:
 
     # Manejo de errores léxicos
     def t_error(self, t):
-        print(f"Caracter ilegal '{t.value[0]}' en la línea {t.lineno}")
+        path, line = None, t.lineno
+        if self.source_map is not None:
+            path, line = self.source_map.locate_line(t.lineno)
+        self.diagnostics.report(ErrorCode.ILLEGAL_CHARACTER, (t.value[0], line, path))
         t.lexer.skip(1)
 
     # Método para construir el lexer
-    def build(self, **kwargs):
+    def build(self, optimize: bool = False, **kwargs):
         """
         Construye el lexer con la configuración de PLY.
+        Con optimize se reutiliza la tabla del lexer guardada en la caché
+        (ver buildcache.py) en lugar de validar y compilar las reglas de nuevo.
+        Con fast_scanner no se construye el lexer de PLY.
         """
-        self.lexer = lex.lex(module=self, **kwargs)
+        if self.fast_scanner:
+            self.lexer = FastScanner(self)
+            return
+
+        if not optimize:
+            self.lexer = lex.lex(module=self, **kwargs)
+            return
+
+        digest = grammar_hash(self, "t_", extra=("tokens", "reserved"))
+        path = table_path("lextab", digest, ".py")
+        # Si la tabla aún no existe, PLY la genera con este nombre en la caché
+        lextab = load_module(path) or os.path.splitext(os.path.basename(path))[0]
+        self.lexer = lex.lex(
+            module=self, optimize=True, lextab=lextab, outputdir=CACHE_DIR, **kwargs
+        )
 
     def run(self) -> None:
         if self.lexer is None:
             print("ERROR: build the lexer first.")
             return None
 
+        binary = BinaryTokenWriter(self.binary_file) if self.binary_tokens else None
         try:
-            with open(self.input_file, "r") as file:
-                content = file.read()
-
             if self.allow_preprocess:
-                # Preprocesamos el contenido
-                content = self.preprocess(self.input_file)
-
-                # Actualizamos la ruta del fichero de entrada para el parser
-                self.parser_input_file = self.output_file.replace(
-                    ".token", ".postprocessed"
+                # El contenido preprocesado se queda en memoria para el parser
+                content = self.preprocessed = self.preprocess(self.input_file)
+
+                if self.keep_postprocessed:
+                    # Exportamos un fichero con el contenido preprocesado
+                    with open(
+                        self.output_file.replace(".token", ".postprocessed"), "w"
+                    ) as pre_file:
+                        pre_file.write(content)
+
+                if self.streaming:
+                    self.token_buffer = TokenStream(
+                        self.lexer,
+                        content.encode("utf-8"),
+                        self.output_file,
+                        binary,
+                        self.chunk_size,
+                    )
+                    return None
+
+            elif self.streaming:
+                self.token_buffer = TokenStream(
+                    self.lexer,
+                    self.input_file,
+                    self.output_file,
+                    binary,
+                    self.chunk_size,
                 )
+                return None
 
-                # Exportamos un fichero con el contenido preprocesado
-                with open(
-                    self.output_file.replace(".token", ".postprocessed"), "w"
-                ) as pre_file:
-                    pre_file.write(content)
+            else:
+                with open(self.input_file, "r") as file:
+                    content = file.read()
 
             self.lexer.input(content)
 
             # Exportamos los tokens a un archivo
-            with open(self.output_file, "w") as file:
-                for token in iter(self.lexer.token, None):
-                    file.write(f"{token.type} {token.value}\n")
+            buffer = TokenBuffer(self.lexer, content) if self.single_pass else None
+            if self.deferred_literals and buffer is not None:
+                # Los literales se convierten al terminar, así que el .token
+                # y el .tokbin se escriben después desde el buffer
+                self.raw_literals = True
+                try:
+                    for token in iter(self.lexer.token, None):
+                        buffer.append(token)
+                finally:
+                    self.raw_literals = False
+                with open(self.output_file, "w") as file:
+                    buffer.write_text(file)
+                if binary is not None:
+                    for token in buffer:
+                        binary.write(token)
+            else:
+                with open(self.output_file, "w") as file:
+                    for token in iter(self.lexer.token, None):
+                        file.write(f"{token.type} {token.value}\n")
+                        if binary is not None:
+                            binary.write(token)
+                        if buffer is not None:
+                            buffer.append(token)
+
+            if binary is not None:
+                binary.close(not content.startswith("\n"), not content.endswith("\n"))
+            self.token_buffer = buffer
 
         except FileNotFoundError as e:
             print(f"ERROR: {e}")
             exit(-1)
 
+    def load_tokens(self, path=None):
+        """
+        Carga los tokens de un .tokbin (por defecto el del fichero actual) como
+        entrada del parser, sin volver a tokenizar el fuente.
+        """
+        if isinstance(self.token_buffer, BinaryTokenReader):
+            # El de una carga anterior (el parser lo cierra al terminar)
+            self.token_buffer.close()
+        source = self.input_file if os.path.exists(self.input_file) else None
+        self.token_buffer = BinaryTokenReader(path or self.binary_file, source)
+
+    def dependencies(self, file_path, visited=None):
+        """
+        Devuelve las rutas absolutas de los ficheros que file_path incluye con
+        %append, directa o indirectamente, sin llegar a preprocesarlos.
+        """
+        if visited is None:
+            visited = []
+
+        file_path = os.path.abspath(file_path)
+        with open(file_path, "r", encoding="utf-8") as f:
+            for line in f:
+                stripped = line.strip()
+                if not stripped.startswith("%append"):
+                    continue
+                parts = shlex.split(stripped)
+                if parts[0] != "%append" or len(parts) != 2:
+                    continue
+                include_path = parts[1]
+                if not os.path.isabs(include_path):
+                    include_path = os.path.join(os.path.dirname(file_path), include_path)
+                include_path = os.path.abspath(include_path)
+                if include_path not in visited:
+                    visited.append(include_path)
+                    self.dependencies(include_path, visited)
+
+        return visited
+
     def preprocess(self, file_path, visited=None):
         """
         Lee el fichero en file_path, expande %append y aplica %supplant,
-        devolviendo el contenido resultante como cadena.
-        Evita inclusiones cíclicas usando el conjunto `visited`.
+        devolviendo el contenido resultante como cadena. Deja en source_map
+        la correspondencia entre sus líneas y las de los ficheros originales.
+        """
+        content, segments = self._expand(file_path, visited)
+        self.source_map = SourceMap(content, segments)
+        return content
+
+    def _expand(self, file_path, visited=None):
+        """
+        Expande file_path y devuelve su contenido junto con sus segmentos
+        (ver SourceMap): (línea del resultado, fichero, línea original).
+        Evita inclusiones cíclicas usando el conjunto `visited` (los ficheros
+        que se están expandiendo). Cada fichero expandido se guarda en
+        include_cache y se reutiliza mientras ni él ni sus incluidos cambien.
         """
         if visited is None:
             visited = set()
@@ -222,49 +776,70 @@ class ViperLexer:
         file_path = os.path.abspath(file_path)
         if file_path in visited:
             raise ValueError(f"Circular include detectado: {file_path}")
+
+        cached = self.include_cache.get(file_path)
+        if cached is not None:
+            return cached
         visited.add(file_path)
 
-        # Lectura de líneas originales
+        stamp = file_stamp(file_path)
+        replacements = {}
+        includes = []
+        segments = []
+        output = io.StringIO()
+        # Líneas escritas en output y desplazamiento (línea escrita - línea
+        # original) del último segmento de este fichero
+        written = 0
+        shift = None
+
+        # Se recorre el fichero línea a línea y se escribe en un único búfer
         with open(file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-
-        replacements = []
-        output_lines = []
-
-        for line in lines:
-            stripped = line.strip()
-            if stripped.startswith("%"):
-                parts = shlex.split(stripped)
-                cmd = parts[0]
-
-                # %append <ruta>
-                if cmd == "%append" and len(parts) == 2:
-                    include_path = parts[1]
-                    # ruta relativa → absoluta (respecto al directorio del fichero padre)
-                    if not os.path.isabs(include_path):
-                        include_path = os.path.join(
-                            os.path.dirname(file_path), include_path
+            for lineno, line in enumerate(f, 1):
+                stripped = line.strip()
+                if stripped.startswith("%"):
+                    parts = shlex.split(stripped)
+                    cmd = parts[0]
+
+                    # %append <ruta>
+                    if cmd == "%append" and len(parts) == 2:
+                        include_path = parts[1]
+                        # ruta relativa → absoluta (respecto al directorio del fichero padre)
+                        if not os.path.isabs(include_path):
+                            include_path = os.path.join(
+                                os.path.dirname(file_path), include_path
+                            )
+                        include_path = os.path.abspath(include_path)
+                        includes.append(include_path)
+                        # recursividad para el fichero incluido, por si hay %appends dentro de %appends
+                        included, included_segments = self._expand(
+                            include_path, visited
                         )
-                    # recursividad para el fichero incluido, por si hay %appends dentro de %appends
-                    included = self.preprocess(include_path, visited)
-                    output_lines.append(included)
-                    continue
-
-                # %supplant A B
-                elif cmd == "%supplant" and len(parts) == 3:
-                    old, new = parts[1], parts[2]
-                    replacements.append((old, new))
-                    continue
-
-            # Si no era directiva, la conservamos
-            output_lines.append(line)
-
-        # Ensamblamos el fichero resultante
-        content = "".join(output_lines)
-        for old, new in replacements:
-            content = content.replace(old, new)
-
-        return content
+                        output.write(included)
+                        segments.extend(
+                            (written + start, path, origin)
+                            for start, path, origin in included_segments
+                        )
+                        written += included.count("\n")
+                        shift = None
+                        continue
+
+                    # %supplant A B (si se repite A, manda la primera regla)
+                    elif cmd == "%supplant" and len(parts) == 3:
+                        replacements.setdefault(parts[1], parts[2])
+                        continue
+
+                # Si no era directiva, la conservamos
+                output.write(line)
+                if written - lineno != shift:
+                    shift = written - lineno
+                    segments.append((written, file_path, lineno))
+                written += 1
+
+        # %supplant no cambia el número de líneas, así que los segmentos valen
+        content = supplant(output.getvalue(), replacements)
+        visited.discard(file_path)
+        self.include_cache.put(file_path, stamp, (content, segments), includes)
+        return content, segments
 
     def token(self):
         """
@@ -1,27 +1,337 @@
-import sys
+import argparse
+import glob
+import io
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from pprint import pprint as pp
 
-from lexer import ViperLexer
+from compcache import CompilationCache
+from exception import ExecutionError
+from interpreter import Interpreter
+from lexer import CHUNK_SIZE, ViperLexer
 from parser import ViperParser
-from pprint import pprint as pp
+from vm import VirtualMachine
 
 
 class Main:
-    def __init__(self, route):
+    def __init__(
+        self, route, replay=False, run=False, vm=False, stats=False, **lexer_options
+    ):
         self.__route = os.path.join(os.path.dirname(__file__), route)
 
-        # Para habiliar el preprocesador, cambiar el siguiente argumento a True
-        self.__lexer = ViperLexer(self.__route, allow_preprocess=False)
-        self.__lexer.build()
-        self.__lexer.run()
+        # El preprocesador se habilita con --preprocess
+        self.__lexer = ViperLexer(self.__route, single_pass=True, **lexer_options)
+        self.__lexer.build(optimize=True)
+        if replay:
+            # Se parsean los tokens del .tokbin generado en una compilación anterior
+            self.__lexer.load_tokens()
+        else:
+            self.__lexer.run()
 
         self.__parser = ViperParser(self.__lexer)
+        self.__parser.build(optimize=True)
         result = self.__parser.parse()
 
+        # Con --run se ejecuta el programa si no tiene errores
+        if run and result is not None and not len(self.__parser.diagnostics):
+            self.execute(result, vm, stats)
+
+    def execute(self, program, vm=False, stats=False):
+        """
+        Ejecuta el programa con el intérprete de árbol (o, con vm, con la
+        máquina virtual de bytecode) y muestra el valor final de las
+        variables globales. Con stats se muestran por la salida de error las
+        instrucciones ejecutadas y las instrucciones por segundo.
+        """
+        engine = VirtualMachine if vm else Interpreter
+        interpreter = engine(self.__parser.record_table)
+        try:
+            interpreter.run(program)
+        except ExecutionError as error:
+            print(f"Error de ejecución: {error}")
+        else:
+            for line in interpreter.dump(self.__parser.symbol_table):
+                print(line)
+        if stats:
+            print(
+                f"{interpreter.instructions} instrucciones en "
+                f"{interpreter.elapsed * 1000:.1f} ms "
+                f"({interpreter.rate():,.0f} instrucciones/s)",
+                file=sys.stderr,
+            )
+
+
+class BatchCompiler:
+    """
+    Compilador reutilizable para varios ficheros. El lexer y el parser se
+    construyen una sola vez y solo se reinician las tablas entre ficheros.
+    Además de los .token, .symbol y .record, se escribe para cada fichero un
+    .error con lo que se habría mostrado por pantalla.
+    Con cache, los ficheros sin cambios se restauran de la caché incremental
+    (salvo que se pida el .tokbin o el .postprocessed, que no se guardan en
+    ella).
+    """
+
+    def __init__(self, cache=False, **lexer_options):
+        self.__lexer = ViperLexer("", single_pass=True, **lexer_options)
+        self.__lexer.build(optimize=True)
+        self.__parser = ViperParser(self.__lexer)
+        self.__parser.build(optimize=True)
+        use_cache = cache and not (
+            self.__lexer.binary_tokens or self.__lexer.keep_postprocessed
+        )
+        self.__cache = CompilationCache() if use_cache else None
+
+    def compile(self, route):
+        """
+        Compila un fichero y devuelve la salida que ha generado junto con si
+        se ha restaurado de la caché (None si la caché está desactivada).
+        """
+        self.__lexer.reset(route)
+        self.__parser.reset()
+        outputs = {
+            "token": self.__lexer.output_file,
+            "symbol": self.__parser.output_route("symbol"),
+            "record": self.__parser.output_route("record"),
+            "error": error_route(route),
+        }
+
+        key = None
+        if self.__cache is not None and os.path.exists(route):
+            dependencies = (
+                self.__lexer.dependencies(route)
+                if self.__lexer.allow_preprocess
+                else []
+            )
+            diagnostics = self.__lexer.diagnostics
+            key = self.__cache.key(
+                route,
+                dependencies,
+                self.__lexer.allow_preprocess,
+                diagnostics.format,
+                diagnostics.max_errors,
+            )
+            cached = self.__cache.restore(key, outputs)
+            if cached is not None:
+                return cached, True
+
+        output = io.StringIO()
+        failed = False
+        with redirect_stdout(output):
+            try:
+                self.__lexer.run()
+                self.__parser.reset()
+                self.__parser.parse()
+            except SystemExit:
+                # El lexer termina el proceso si no encuentra el fichero; en
+                # modo batch solo se aborta ese fichero
+                pass
+            except Exception as error:
+                # Igual con un fallo del compilador: el error queda en el
+                # .error de este fichero y se sigue con el resto
+                print(internal_error(error), end="")
+                self.__parser.reset()
+                failed = True
+
+        with open(error_route(route), "w") as file:
+            file.write(output.getvalue())
+
+        # Los fallos del compilador no se guardan en la caché
+        if key is not None and not failed:
+            self.__cache.store(key, outputs)
+        return output.getvalue(), (False if key is not None else None)
+
+
+# Compilador de cada proceso del pool (ver BatchMain con jobs > 1)
+_worker_compiler = None
+
+
+def _init_worker(cache, lexer_options):
+    global _worker_compiler
+    _worker_compiler = BatchCompiler(cache, **lexer_options)
+
+
+def _compile_in_worker(route):
+    return _compile_isolated(_worker_compiler, route)
+
+
+def _compile_isolated(compiler, route):
+    # Un fallo fuera del análisis (caché, apertura de ficheros...) no debe
+    # propagarse por pool.map y tirar el lote: se devuelve como el texto de
+    # error de ese fichero y se conserva el orden de los resultados
+    try:
+        return compiler.compile(route)
+    except Exception as error:
+        message = internal_error(error)
+        with open(error_route(route), "w") as file:
+            file.write(message)
+        return message, None
+
+
+def error_route(route):
+    return f"{route.replace(".vip", "")}.error"
+
+
+def internal_error(error):
+    """Mensaje de un fallo del compilador (una excepción no prevista)"""
+    return f"Error interno del compilador: {type(error).__name__}: {error}\n"
+
+
+class BatchMain:
+    """
+    Compila varios ficheros .vip en un mismo proceso o, con jobs > 1,
+    repartiéndolos entre un pool de procesos. La salida de cada fichero se
+    recoge por separado y los resultados se muestran en el orden de entrada.
+    """
+
+    def __init__(self, sources, jobs=1, cache=False, **lexer_options):
+        self.__routes = self.expand(sources)
+
+        if jobs > 1:
+            chunksize = max(1, len(self.__routes) // (jobs * 4))
+            with ProcessPoolExecutor(
+                jobs, initializer=_init_worker, initargs=(cache, lexer_options)
+            ) as pool:
+                results = list(
+                    pool.map(_compile_in_worker, self.__routes, chunksize=chunksize)
+                )
+        else:
+            compiler = BatchCompiler(cache, **lexer_options)
+            results = [_compile_isolated(compiler, route) for route in self.__routes]
+
+        for route, (output, _) in zip(self.__routes, results):
+            if output:
+                print(f"{route}: errores en {error_route(route)}")
+
+        if cache:
+            # Las estadísticas se suman aquí porque cada proceso tiene su caché
+            stats = CompilationCache()
+            stats.hits = sum(1 for _, hit in results if hit)
+            stats.misses = sum(1 for _, hit in results if hit is False)
+            stats.evict()
+            print(stats)
+
+    @staticmethod
+    def expand(sources):
+        """
+        Convierte la lista de directorios, patrones glob y ficheros recibida
+        en la lista ordenada de rutas .vip a compilar.
+        """
+        routes = []
+        for source in sources:
+            source = os.path.join(os.path.dirname(__file__), source)
+            if os.path.isdir(source):
+                routes.extend(sorted(glob.glob(os.path.join(source, "*.vip"))))
+            elif glob.has_magic(source):
+                routes.extend(sorted(glob.glob(source)))
+            else:
+                routes.append(source)
+        return routes
+
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python3 main.py <file>")
-        exit(1)
+    arg_parser = argparse.ArgumentParser(prog="python3 main.py")
+    arg_parser.add_argument(
+        "files", nargs="+", help="fichero .vip (o directorios y globs con --batch)"
+    )
+    arg_parser.add_argument(
+        "--batch", action="store_true", help="compila varios ficheros en un proceso"
+    )
+    arg_parser.add_argument(
+        "--jobs", type=int, default=1, help="número de procesos para --batch"
+    )
+    arg_parser.add_argument(
+        "--cache", action="store_true", help="reutiliza los artefactos sin cambios"
+    )
+    arg_parser.add_argument(
+        "--stream", action="store_true", help="tokeniza por trozos (ficheros enormes)"
+    )
+    arg_parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CHUNK_SIZE,
+        help="bytes de cada trozo con --stream",
+    )
+    arg_parser.add_argument(
+        "--binary-tokens", action="store_true", help="escribe también el .tokbin"
+    )
+    arg_parser.add_argument(
+        "--fast-scanner",
+        action="store_true",
+        help="tokeniza con el escáner escrito a mano en lugar de con PLY",
+    )
+    arg_parser.add_argument(
+        "--deferred-literals",
+        action="store_true",
+        help="convierte los literales numéricos en bloque tras tokenizar",
+    )
+    arg_parser.add_argument(
+        "--preprocess", action="store_true", help="expande %%append y %%supplant"
+    )
+    arg_parser.add_argument(
+        "--keep-postprocessed",
+        action="store_true",
+        help="escribe el .postprocessed (con --preprocess)",
+    )
+    arg_parser.add_argument(
+        "--max-errors", type=int, help="número máximo de errores que se muestran"
+    )
+    arg_parser.add_argument(
+        "--diagnostics",
+        choices=("text", "json"),
+        default="text",
+        help="formato de los errores",
+    )
+    arg_parser.add_argument(
+        "--replay", action="store_true", help="parsea el .tokbin sin tokenizar"
+    )
+    arg_parser.add_argument(
+        "--run", action="store_true", help="ejecuta el programa si no tiene errores"
+    )
+    arg_parser.add_argument(
+        "--vm",
+        action="store_true",
+        help="ejecuta con la máquina virtual de bytecode (con --run)",
+    )
+    arg_parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="muestra las instrucciones por segundo (con --run)",
+    )
+    args = arg_parser.parse_args()
+    lexer_options = {
+        "allow_preprocess": args.preprocess,
+        "keep_postprocessed": args.keep_postprocessed,
+        "streaming": args.stream,
+        "chunk_size": args.chunk_size,
+        "binary_tokens": args.binary_tokens,
+        "fast_scanner": args.fast_scanner,
+        "deferred_literals": args.deferred_literals,
+        "max_errors": args.max_errors,
+        "diagnostics_format": args.diagnostics,
+    }
+
+    if args.batch or args.jobs > 1 or args.cache:
+        if args.run:
+            arg_parser.error("--run solo se admite con un fichero")
+        BatchMain(args.files, args.jobs, args.cache, **lexer_options)
+        exit(0)
 
-    Main(sys.argv[1])
+    if len(args.files) != 1:
+        arg_parser.error("sin --batch solo se admite un fichero")
+
+    try:
+        Main(
+            args.files[0],
+            replay=args.replay,
+            run=args.run,
+            vm=args.vm,
+            stats=args.stats,
+            **lexer_options,
+        )
+    except Exception as error:
+        # El mismo mensaje que en modo batch (ver BatchCompiler.compile)
+        print(internal_error(error), end="")
+        exit(1)
@@ -1,18 +1,73 @@
 # objects.py
 # Modelo de los nodos
+from itertools import count
 from tkinter.messagebox import RETRY
 
+from datatypes import BOOL, CHAR, FLOAT, INT, function_type, vector_type
+from diagnostics import ErrorCode
 from exception import SemanticError
+from typerules import binary_result, unary_result
+
+
+# Cambia cada vez que cambia el tipo de una variable (ver Symbol): invalida
+# los tipos que las expresiones tienen cacheados
+_revisions = count()
+_revision = next(_revisions)
+
+# Listas donde se apuntan los errores reportados al inferir cada expresión
+# que se está calculando (la última es la de la expresión más interna)
+_inferring = []
 
 
 # Nodo base para todas las expresiones
 class Expression:
+    # Tipo cacheado: ((generación del ámbito, revisión de los tipos de las
+    # variables), tipo, errores de la inferencia)
+    _inferred = None
+
     def infer_type(self, symbols, records):
         """Inferir y devolver el tipo de la expresión usando las tablas:
         symbols: tabla de símbolos de variables/funciones
-        records: tabla de definiciones de records."""
+        records: tabla de definiciones de records.
+
+        El resultado de _infer_type se cachea mientras no cambie la generación
+        del ámbito de symbols (se abre o cierra un ámbito o se declara una
+        variable) ni el tipo de ninguna variable, así que cada subárbol se
+        tipa una sola vez. Los errores que se reportaron al calcularlo se
+        repiten en cada consulta, igual que si se hubiera vuelto a inferir."""
+        generation = (symbols.generation if symbols is not None else None, _revision)
+        cached = self._inferred
+        if cached is not None and cached[0] == generation:
+            for code, args in cached[2]:
+                self._report(code, args)
+            return cached[1]
+
+        errors = []
+        _inferring.append(errors)
+        try:
+            datatype = self._infer_type(symbols, records)
+        finally:
+            _inferring.pop()
+        if _inferring:
+            _inferring[-1].extend(errors)
+        self._inferred = (generation, datatype, errors)
+        return datatype
+
+    def _infer_type(self, symbols, records):
         raise NotImplementedError()
 
+    @property
+    def inferred_type(self):
+        """Último tipo inferido (sin volver a inferirlo), o None"""
+        return self._inferred[1] if self._inferred is not None else None
+
+    @staticmethod
+    def _report(code, args):
+        """Reporta un error de inferencia y lo apunta para la caché"""
+        if _inferring:
+            _inferring[-1].append((code, args))
+        SemanticError.report(code, args)
+
 
 # ——— Expr. atómicas ——————————————————————————————————————————————
 
@@ -24,16 +79,16 @@ class Literal(Expression):
 
     def infer_type(self, symbols, records):
         if isinstance(self.value, bool):
-            return "bool"
+            return BOOL
         if isinstance(self.value, float):
-            return "float"
+            return FLOAT
         if isinstance(self.value, int):
-            return "int"
+            return INT
 
         if self.value == "true" or self.value == "false":
-            return "bool"
+            return BOOL
         if isinstance(self.value, str):
-            return "char"
+            return CHAR
         raise SemanticError("Tipo de literal desconocido: %r" % self.value)
 
     def __repr__(self):
@@ -41,61 +96,35 @@ class Literal(Expression):
 
 
 class VariableRef(Expression):
-    def __init__(self, name):
+    """
+    Uso de una variable en una expresión: identificador más la cadena de
+    accesos (("field", nombre) o ("index", expresión)). symbol es la
+    Variable/Vector que el análisis semántico obtuvo al recorrer la cadena;
+    el tipo, el valor y la representación en los mensajes de error son los
+    suyos, así que los diagnósticos no cambian por usar este nodo.
+    """
+
+    def __init__(self, name, ref_chain, symbol):
         self.name = name
-        # ref_chain para futuros accesos a campos o índices
-        self.ref_chain = []
-        self.value = None
+        self.ref_chain = ref_chain
+        self.symbol = symbol
 
-    def add_field(self, field_name, symbols, records):
-        # 1. Inferimos el tipo actual de esta referencia
-        base_type = self.infer_type(symbols, records)
-        # 2. Comprobamos que es un record conocido
-        record_def = records.lookup(base_type)
-        if record_def is None:
-            raise SemanticError(f"Tipo `{base_type}` no es un record")
-        # 3. Comprobamos que el campo existe
-        if field_name not in record_def.fields:
-            raise SemanticError(
-                f"Field `{field_name}` no existe en record `{base_type}`"
-            )
-        # 4. Finalmente, registramos el acceso
-        self.ref_chain.append(("field", field_name))
-        return self
-
-    def add_index(self, index_expr, symbols, records):
-        # 1. Comprobamos el índice es un int
-        idx_type = index_expr.infer_type(symbols, records)
-        if idx_type != "int":
-            raise SemanticError(f"Índice de vector debe ser `int` (vino `{idx_type}`)")
-        # 2. Inferimos el tipo actual y comprobamos que es vector
-        base_type = self.infer_type(symbols, records)
-        if not base_type.endswith("[]"):
-            raise SemanticError(f"Tipo `{base_type}` no es un vector")
-        # 3. Registramos el acceso
-        self.ref_chain.append(("index", index_expr))
-        return self
+    @property
+    def datatype(self):
+        return self.symbol.datatype
+
+    @property
+    def value(self):
+        return self.symbol.value
 
     def infer_type(self, symbols, records):
-        pass
+        return self.symbol.infer_type(symbols, records)
 
     def __str__(self):
-        result = f"VariableRef({self.name}"
-        for kind, payload in self.ref_chain:
-            if kind == "field":
-                result += f".{payload}"
-            elif kind == "index":
-                result += f"[{payload}])"
-        return result
+        return str(self.symbol)
 
     def __repr__(self):
-        result = f"{self.name}"
-        for kind, payload in self.ref_chain:
-            if kind == "field":
-                result += f".{payload}"
-            elif kind == "index":
-                result += f"[{payload}]"
-        return result
+        return repr(self.symbol)
 
 
 class FunctionCall(Expression):
@@ -122,42 +151,17 @@ class BinaryExpr(Expression):
         self.right = right  # Expression
         self.value = None
 
-    def infer_type(self, symbols, records):
+    def _infer_type(self, symbols, records):
         lt = self.left.infer_type(symbols, records) if self.left != None else None
         rt = self.right.infer_type(symbols, records) if self.right != None else None
-        # Aritméticas
         if lt == None or rt == None:
             return None
 
-        if self.op in ("+", "-"):
-            if lt in ("int", "float") and rt in ("int", "float"):
-                return "float" if "float" in (lt, rt) else "int"
-            # Hay que tener en cuenta los chars tmb. Char se puede convertir a int o float
-            if lt == "char" and rt in ("int", "float"):
-                return "float" if "float" in rt else "int"
-            if lt in ("int", "float") and rt == "char":
-                return "float" if "float" in lt else "int"
-
-        if self.op in ("*", "/"):
-            if lt in ("int", "float") and rt in ("int", "float"):
-                return "float"
-            if lt == "char" and rt in ("int", "float"):
-                return "float"
-            if lt in ("int", "float") and rt == "char":
-                return "float"
-
-        # Relacionales
-        if self.op in ("==", "!=", ">", "<", ">=", "<="):
-            if lt == rt:
-                return "bool"
-        # Lógicas
-        if self.op in ("and", "or"):
-            if lt == "bool" and rt == "bool":
-                return "bool"
+        result = binary_result(self.op, lt, rt)
+        if result is not None:
+            return result
         # raise SemanticError(f"Operador '{self.op}' no válido para tipos {lt} y {rt}")
-        SemanticError.print_sem_error(
-            "Incompatible Operands", [self.op, self.left, self.right]
-        )
+        self._report(ErrorCode.INCOMPATIBLE_OPERANDS, [self.op, self.left, self.right])
         return None
 
     def __str__(self):
@@ -172,14 +176,11 @@ class UnaryExpr(Expression):
         self.op = op  # '-', '+', 'not'
         self.expr = expr  # Expression
 
-    def infer_type(self, symbols, records):
+    def _infer_type(self, symbols, records):
         t = self.expr.infer_type(symbols, records)
-        if self.op in ("-", "+"):
-            if t in ("int", "float"):
-                return t
-        if self.op == "not":
-            if t == "bool":
-                return "bool"
+        result = unary_result(self.op, t)
+        if result is not None:
+            return result
         raise SemanticError(f"Operador unario '{self.op}' no válido para tipo {t}")
 
     def __str__(self):
@@ -188,16 +189,45 @@ class UnaryExpr(Expression):
 
 class Record:
     def __init__(self, name, fields):
-        # fields: dict nombre_campo -> tipo (string)
+        # fields: dict nombre_campo -> Variable/Vector (en orden de declaración)
         self.name = name
         self.fields = fields
+        # Desplazamiento y tamaño (en bytes) de cada campo dentro del registro.
+        # Valen None si algún tamaño no se conoce en tiempo de compilación.
+        self.offsets = {}
+        self.sizes = {}
+        self.size = 0
+
+    def __repr__(self):
+        return f"{list(self.fields.values())}"
+
 
+class Symbol:
+    """
+    Base de Variable y Vector. El análisis semántico cambia el datatype de
+    una variable al detectar algunos errores; al hacerlo se invalidan los
+    tipos cacheados de las expresiones (ver Expression.infer_type).
+    """
 
-class Variable:
+    # Expresión con la que se inicializa en su declaración (o None)
+    init = None
+
+    @property
+    def datatype(self):
+        return self._datatype
+
+    @datatype.setter
+    def datatype(self, datatype):
+        global _revision
+        self._datatype = datatype
+        _revision = next(_revisions)
+
+
+class Variable(Symbol):
     def __init__(self, name, datatype, value):
         self.name = name  # identificador
         self.datatype = (
-            datatype  # 'int', 'float', 'bool', 'char', 'Pair', 'int[]', etc.
+            datatype  # datatypes.Type: INT, FLOAT, BOOL, CHAR, record_type("Pair")...
         )
         self.value = value
 
@@ -208,14 +238,13 @@ class Variable:
         return self.datatype
 
 
-class Vector:
+class Vector(Symbol):
     def __init__(self, name, datatype, length, value):
         self.name = name
         self.datatype = datatype
         self.length = (
             length
-            if length.infer_type(None, None) == "int"
-            or length.infer_type(None, None) == "char"
+            if length.infer_type(None, None) in (INT, CHAR)
             else None
         )
         self.value = value
@@ -223,6 +252,14 @@ class Vector:
     def infer_type(self, symbols, records):
         return self.datatype
 
+    @property
+    def type(self):
+        """Tipo vector (datatypes.VectorType): elemento y longitud si se conoce"""
+        length = self.length.value if isinstance(self.length, Literal) else None
+        if isinstance(length, str):
+            length = ord(length)
+        return vector_type(self.datatype, length)
+
     def __repr__(self):
         return f"Vector[{self.datatype}] {self.name}"
 
@@ -232,14 +269,95 @@ class Function:
     def __init__(self, name, datatype, parameters, return_type):
         self.name = name  # identificador
         self.datatype = datatype
-        self.parameters = (
-            parameters  # lista de tipos de parámetros, e.g. ['int','float']
-        )
-        self.return_type = return_type  # tipo de retorno, e.g. 'bool'
+        self.parameters = parameters  # lista de Variable/Vector de los parámetros
+        self.return_type = return_type  # tipo de retorno, e.g. BOOL
         self.body = []
 
+    @property
+    def type(self):
+        """Firma de la función (datatypes.FunctionType)"""
+        return function_type(
+            (parameter.datatype for parameter in self.parameters), self.return_type
+        )
+
     def __str__(self):
         return f"Function({self.name},{self.datatype},{self.parameters},{self.return_type},{self.body})"
 
     def __repr__(self):
         return f"Function({self.name},{self.datatype},{self.parameters},{self.return_type},{self.body})"
+
+
+# ——— Sentencias ——————————————————————————————————————————————————
+
+
+class Program:
+    def __init__(self, statements):
+        self.statements = statements  # sentencias, tipos y funciones en orden
+
+    def __repr__(self):
+        return f"Program({self.statements})"
+
+
+class Declaration:
+    def __init__(self, variables):
+        # variables: Variable/Vector declarados. Si hay valor inicial, es el
+        # init del último y se asigna a todos
+        self.variables = variables
+
+    @property
+    def init(self):
+        return self.variables[-1].init
+
+    def __repr__(self):
+        return f"Declaration({self.variables}, {self.init})"
+
+
+class Assignment:
+    def __init__(self, target, value):
+        self.target = target  # VariableRef
+        self.value = value  # Expression o Assignment (asignación en cadena)
+
+    def infer_type(self, symbols, records):
+        # En una asignación en cadena el valor es el del destino
+        return self.target.datatype
+
+    def __repr__(self):
+        return f"Assignment({self.target.name}, {self.value})"
+
+
+class IfStatement:
+    def __init__(self, condition, body, orelse):
+        self.condition = condition
+        self.body = body  # lista de sentencias
+        self.orelse = orelse  # lista de sentencias del else (vacía si no hay)
+
+    def __repr__(self):
+        return f"IfStatement({self.condition}, {self.body}, {self.orelse})"
+
+
+class WhileStatement:
+    def __init__(self, condition, body):
+        self.condition = condition
+        self.body = body
+
+    def __repr__(self):
+        return f"WhileStatement({self.condition}, {self.body})"
+
+
+class TypeDefinition:
+    def __init__(self, datatype, fields):
+        self.datatype = datatype  # datatypes.RecordType
+        self.fields = fields  # Variable/Vector de los atributos
+
+    def __repr__(self):
+        return f"TypeDefinition({self.datatype}, {self.fields})"
+
+
+class FunctionDefinition:
+    def __init__(self, function, body, result):
+        self.function = function  # Function de la tabla de símbolos
+        self.body = body  # sentencias del cuerpo
+        self.result = result  # expresión del return
+
+    def __repr__(self):
+        return f"FunctionDefinition({self.function.name}, {self.body}, {self.result})"
@@ -1,5 +1,11 @@
 import ply.yacc as yacc
-from lexer import ViperLexer
+from buildcache import grammar_hash, table_path
+from datatypes import BOOL, CHAR, INT, NONE, Type, named_type, release_composites
+from diagnostics import ErrorCode
+from lexer import TokenStream, ViperLexer
+from tokenfile import BinaryTokenReader
+from sourcemap import LineIndex
+from typerules import compatible
 
 from objects import *
 from tables import Recordtable, SymbolTable
@@ -24,23 +30,39 @@ class ViperParser:
         ("right", "NOT"),
     )
 
-    def _compatible(self, dest: str, src: str) -> bool:
-        PROMOTIONS = {
-            ('int', 'float'),  # int  → float
-            ('char', 'float'),  # char → float
-            ('char', 'int'),  # char → int
-        }
-        return dest == src or (dest, src) in PROMOTIONS
+    def _compatible(self, dest: Type, src: Type) -> bool:
+        # Consulta la tabla de compatibilidad precalculada en typerules
+        return compatible(dest, src)
+
+    @staticmethod
+    def _is_variable(expression):
+        # Uso de una variable (no de un vector) en una expresión
+        return isinstance(expression, VariableRef) and isinstance(
+            expression.symbol, Variable
+        )
 
     def __init__(self, lexer: ViperLexer):
         """
         Creamos una instancia de ViperLexer y el parser Yacc.
         """
         self.lexer = lexer
-        self.route = self.lexer.parser_input_file
         self.parser = None
+        self.reset()
+
+    def reset(self):
+        """
+        Prepara el parser para el fichero que tenga cargado el lexer, con
+        tablas de símbolos y registros vacías. Las tablas LALR se conservan.
+        """
+        self.route = self.lexer.parser_input_file
+        # Los errores se recogen en el colector del lexer, que también
+        # tiene los léxicos, y se muestran todos al final de parse()
+        self.diagnostics = self.lexer.diagnostics
+        self._lines = None
         self.record_table = Recordtable()
         self.symbol_table = SymbolTable()
+        # Los tipos de registros, vectores y funciones son de cada fichero
+        release_composites()
 
     # ------------------------------------------------------------
     # Reglas de la gramática (sin cambiar la definición)
@@ -52,9 +74,10 @@ class ViperParser:
         program : statement_list
                 |
         """
-        # Unificamos la salida: si no hay statements, devolvemos lista vacía
+        # Unificamos la salida: si no hay statements, el programa está vacío.
+        # Las líneas en blanco no dejan nodo
         statements = p[1] if len(p) > 1 and p[1] else []
-        p[0] = ("program", statements)
+        p[0] = Program([statement for statement in statements if statement is not None])
 
     # Lista de sentencias
     def p_statement_list(self, p):
@@ -62,8 +85,10 @@ class ViperParser:
         statement_list : statement_list statement
                        | statement
         """
+        # Se añade sobre la misma lista para no copiarla en cada sentencia
         if len(p) == 3:
-            p[0] = p[1] + [p[2]]
+            p[1].append(p[2])
+            p[0] = p[1]
         else:
             p[0] = [p[1]]
 
@@ -105,7 +130,12 @@ class ViperParser:
                  | if_statement
                  | while_statement
         """
-        p[0] = p[1]
+        # La declaración devuelve la lista de variables, que también usan
+        # los tipos y los parámetros; como sentencia se envuelve en su nodo
+        if p.slice[1].type == "declaration":
+            p[0] = Declaration(p[1])
+        else:
+            p[0] = p[1]
 
     def p_expression_binary(self, p):
         """
@@ -154,14 +184,10 @@ class ViperParser:
 
         if self.symbol_table._scope.startswith("FUNCTIONBODY"):
             func_scope_name = self.symbol_table._scope.split("-")[1]
-            function_scope = self.symbol_table.lookup_function(func_scope_name)
-            list_variables = SymbolTable()
-            for var2 in function_scope.body + function_scope.parameters:
-                list_variables.add_variable(var2)
 
             if func_name not in self.symbol_table._functions.keys():
-                SemanticError.print_sem_error(
-                    "Function not found FUNC", [func_name, func_scope_name]
+                SemanticError.report(
+                    ErrorCode.FUNCTION_NOT_FOUND_FUNC, [func_name, func_scope_name]
                 )
                 func_call.datatype = None
                 p[0] = func_call
@@ -169,8 +195,8 @@ class ViperParser:
 
             function = self.symbol_table._functions[func_name]
             if len(func_params) != len(function.parameters):
-                SemanticError.print_sem_error(
-                    "Function parameters mismatch FUNC",
+                SemanticError.report(
+                    ErrorCode.PARAMETER_COUNT_FUNC,
                     [func_name, func_params, function.parameters, func_scope_name],
                 )
                 func_call.datatype = None
@@ -180,17 +206,18 @@ class ViperParser:
             for parameter_to_pass, original_parameters in zip(
                 func_params, function.parameters
             ):
-                if isinstance(parameter_to_pass, Variable) and not list_variables.exists_variable(parameter_to_pass.name):
-                    SemanticError.print_sem_error(
-                        "Variable not found Function",
+                if self._is_variable(parameter_to_pass) and not self.symbol_table.exists_local(parameter_to_pass.name):
+                    SemanticError.report(
+                        ErrorCode.VARIABLE_NOT_FOUND_FUNC,
                         [parameter_to_pass.name, func_scope_name],
                     )
                     func_call.datatype = None
                     p[0] = func_call
                     return None
-                if not self._compatible(parameter_to_pass.datatype, original_parameters.datatype):
-                    SemanticError.print_sem_error(
-                        "Function error parameter FUNC",
+                argument_type = parameter_to_pass.infer_type(self.symbol_table, self.record_table)
+                if not self._compatible(argument_type, original_parameters.datatype):
+                    SemanticError.report(
+                        ErrorCode.PARAMETER_TYPE_FUNC,
                         [
                             parameter_to_pass,
                             original_parameters,
@@ -205,15 +232,15 @@ class ViperParser:
 
         else:
             if func_name not in self.symbol_table._functions.keys():
-                SemanticError.print_sem_error("Function not found", [func_name])
+                SemanticError.report(ErrorCode.FUNCTION_NOT_FOUND, [func_name])
                 func_call.datatype = None
                 p[0] = func_call
                 return None
 
             function = self.symbol_table._functions[func_name]
             if len(func_params) != len(function.parameters):
-                SemanticError.print_sem_error(
-                    "Function parameters mismatch",
+                SemanticError.report(
+                    ErrorCode.PARAMETER_COUNT,
                     [func_name, func_params, function.parameters],
                 )
                 func_call.datatype = None
@@ -222,16 +249,17 @@ class ViperParser:
             for parameter_to_pass, original_parameters in zip(
                 func_params, function.parameters
             ):
-                if isinstance(parameter_to_pass, Variable) and not self.symbol_table.exists_variable(parameter_to_pass.name):
-                    SemanticError.print_sem_error(
-                        "Variable not found", parameter_to_pass.name
+                if self._is_variable(parameter_to_pass) and not self.symbol_table.exists_variable(parameter_to_pass.name):
+                    SemanticError.report(
+                        ErrorCode.VARIABLE_NOT_FOUND, parameter_to_pass.name
                     )
                     func_call.datatype = None
                     p[0] = func_call
                     return None
-                if parameter_to_pass.datatype != original_parameters.datatype:
-                    SemanticError.print_sem_error(
-                        "Function error parameter",
+                argument_type = parameter_to_pass.infer_type(self.symbol_table, self.record_table)
+                if argument_type != original_parameters.datatype:
+                    SemanticError.report(
+                        ErrorCode.PARAMETER_TYPE,
                         [parameter_to_pass, original_parameters, func_name],
                     )
 
@@ -266,31 +294,28 @@ class ViperParser:
 
         if self.symbol_table._scope.startswith("FUNCTIONBODY"):
             func_name = self.symbol_table._scope.split("-")[1]
-            func = self.symbol_table.lookup_function(func_name)
-
-            local_tbl = SymbolTable()
-            for v in func.parameters + func.body:
-                local_tbl.add_variable(v)
-
-            var = local_tbl.lookup_variable(identifier)
+            var = self.symbol_table.lookup_local(identifier)
             if var is None:
-                SemanticError.print_sem_error(
-                    "Variable not found Function", [identifier, func_name]
+                SemanticError.report(
+                    ErrorCode.VARIABLE_NOT_FOUND_FUNC, [identifier, func_name]
                 )
                 var = Variable(identifier, None, None)
         else:
             var = self.symbol_table.lookup_variable(identifier)
             if var is None:
-                SemanticError.print_sem_error("Variable not found", identifier)
+                SemanticError.report(ErrorCode.VARIABLE_NOT_FOUND, identifier)
                 var = Variable(identifier, None, None)
 
+        # Los índices no cambian el tipo, así que el atributo alcanzado solo
+        # depende del tipo raíz y de los campos recorridos hasta el momento
+        root_type, path = var.datatype, ()
         counter = 0
         for kind, payload in ref_chain:
 
             if kind == "field":
                 if isinstance(var, Vector) and counter == len(ref_chain) - 1:
-                    SemanticError.print_sem_error(
-                        "No Vector DEC Error", [var.value, var.name]
+                    SemanticError.report(
+                        ErrorCode.MISSING_VECTOR_INDEX, [var.value, var.name]
                     )
                     var.datatype = None
                     break
@@ -299,23 +324,18 @@ class ViperParser:
                     var.datatype not in self.record_table._basic_symbols
                     and not self.record_table.exists(var.datatype)
                 ):
-                    SemanticError.print_sem_error(
-                        "Type Error Not defined", [identifier, var.datatype]
+                    SemanticError.report(
+                        ErrorCode.ATTRIBUTE_NOT_DEFINED, [identifier, var.datatype]
                     )
 
-                if var.datatype in self.record_table._basic_symbols or payload not in [
-                    f.name for f in self.record_table._table[var.datatype]
-                ]:
-                    SemanticError.print_sem_error(
-                        "Attribute of type", [var.datatype, payload]
+                path += (payload,)
+                field_obj = self.record_table.resolve(root_type, path)
+                if field_obj is None:
+                    SemanticError.report(
+                        ErrorCode.NO_ATTRIBUTE, [var.datatype, payload]
                     )
                     var = Variable(identifier, None, payload)
                 else:
-                    field_obj = next(
-                        f
-                        for f in self.record_table._table[var.datatype]
-                        if f.name == payload
-                    )
                     if isinstance(field_obj, Vector):
                         var = Vector(
                             identifier, field_obj.datatype, field_obj.length, payload
@@ -329,30 +349,23 @@ class ViperParser:
                     var.datatype not in self.record_table._basic_symbols
                     and not self.record_table.exists(var.datatype)
                 ):
-                    SemanticError.print_sem_error(
-                        "Type Error Not defined", [identifier, var.datatype]
+                    SemanticError.report(
+                        ErrorCode.ATTRIBUTE_NOT_DEFINED, [identifier, var.datatype]
                     )
 
                 if not isinstance(var, Vector):
-                    SemanticError.print_sem_error(
-                        "No Vector Error", [var.value, var.name]
+                    SemanticError.report(
+                        ErrorCode.NOT_A_VECTOR, [var.value, var.name]
                     )
-                idx_type = payload.infer_type(
-                    (
-                        self.symbol_table
-                        if not self.symbol_table._scope.startswith("FUNCTIONBODY")
-                        else local_tbl
-                    ),
-                    self.record_table,
-                )
-                if idx_type not in ("int", "char"):
-                    SemanticError.print_sem_error(
-                        "Vector length error", [identifier, idx_type]
+                idx_type = payload.infer_type(self.symbol_table, self.record_table)
+                if idx_type not in (INT, CHAR):
+                    SemanticError.report(
+                        ErrorCode.VECTOR_LENGTH, [identifier, idx_type]
                     )
                     var.datatype = None
                     break
 
-        p[0] = var
+        p[0] = VariableRef(identifier, ref_chain, var)
 
     # Una referencia es la indexación de un vector o el acceso a un campo
     # de un registro. Ambas cosas pueden ser recursivas. Además, también
@@ -386,41 +399,36 @@ class ViperParser:
         ident, ref_chain, rhs = p[1], p[2], p[4]
 
         if self.symbol_table._scope.startswith("FUNCTIONBODY"):
-            func_name = self.symbol_table._scope.split("-")[1]
-            funct = self.symbol_table.lookup_function(func_name)
-            visible = SymbolTable()
-            for v in funct.parameters + funct.body:
-                visible.add_variable(v)
+            var = self.symbol_table.lookup_local(ident)
         else:
-            visible = self.symbol_table
-
-        var = visible.lookup_variable(ident)
+            var = self.symbol_table.lookup_variable(ident)
         if var is None:
-            SemanticError.print_sem_error("Variable not found", ident)
-            p[0] = Variable(ident, None, None)
+            SemanticError.report(ErrorCode.VARIABLE_NOT_FOUND, ident)
+            p[0] = Assignment(VariableRef(ident, ref_chain, Variable(ident, None, None)), rhs)
             return
 
+        root_type, path = var.datatype, ()
         for i, (kind, payload) in enumerate(ref_chain):
             last = i == len(ref_chain) - 1
 
             if kind == "field":
                 # var debe ser registro
                 if isinstance(var, Vector) and last:
-                    SemanticError.print_sem_error("No Vector DEC Error", [var.value, var.name])
+                    SemanticError.report(ErrorCode.MISSING_VECTOR_INDEX, [var.value, var.name])
                     var.datatype = None
                     break
 
                 if var.datatype in self.record_table._basic_symbols or not self.record_table.exists(var.datatype):
-                    SemanticError.print_sem_error("Type Error Not defined", [ident, var.datatype])
+                    SemanticError.report(ErrorCode.ATTRIBUTE_NOT_DEFINED, [ident, var.datatype])
 
                 # Comprueba que el campo exista
-                fields = {f.name: f for f in self.record_table._table[var.datatype]}
-                if payload not in fields:
-                    SemanticError.print_sem_error("Attribute of type", [var.datatype, payload])
+                path += (payload,)
+                field_obj = self.record_table.resolve(root_type, path)
+                if field_obj is None:
+                    SemanticError.report(ErrorCode.NO_ATTRIBUTE, [var.datatype, payload])
                     var = Variable(ident, None, payload)
                     continue
 
-                field_obj = fields[payload]
                 if isinstance(field_obj, Vector):
                     var = Vector(ident, field_obj.datatype, field_obj.length, payload)
                 else:
@@ -429,11 +437,11 @@ class ViperParser:
             else:  #INDEX
                 # var debe ser Vector
                 if not isinstance(var, Vector):
-                    SemanticError.print_sem_error("No Vector Error", [var.value, var.name])
+                    SemanticError.report(ErrorCode.NOT_A_VECTOR, [var.value, var.name])
 
-                idx_type = payload.infer_type(visible, self.record_table)
-                if idx_type not in ("int", "char"):
-                    SemanticError.print_sem_error("Vector length error", [ident, idx_type])
+                idx_type = payload.infer_type(self.symbol_table, self.record_table)
+                if idx_type not in (INT, CHAR):
+                    SemanticError.report(ErrorCode.VECTOR_LENGTH, [ident, idx_type])
                     var.datatype = None
                     break
 
@@ -447,15 +455,15 @@ class ViperParser:
                     var = Vector(ident, elem_type, payload, var.value)  # vector de vectores
 
         #Tipo
-        rhs_type = rhs.infer_type(visible, self.record_table) if not isinstance(rhs, Variable) else rhs.datatype
+        rhs_type = rhs.infer_type(self.symbol_table, self.record_table)
 
         #COmpatibilidad
         if not self._compatible(var.datatype, rhs_type):
-            SemanticError.print_sem_error("Incompatible Types Assignment",
-                                          [var.datatype, rhs_type, ident, visible, self.record_table])
+            SemanticError.report(ErrorCode.INCOMPATIBLE_ASSIGNMENT,
+                                          [var.datatype, rhs_type, ident, self.symbol_table, self.record_table])
             var.datatype = None
 
-        p[0] = var
+        p[0] = Assignment(VariableRef(ident, ref_chain, var), rhs)
 
     def p_declaration(self, p):
         """
@@ -465,7 +473,7 @@ class ViperParser:
                    | CHAR_TYPE variable_list
                    | ID variable_list
         """
-        datatype = p[1]
+        datatype = named_type(p[1])
         variables = p[2]
 
         # DE HABER VALOR, SE GUARDA EN EL ÚLTIMO ELEMENTO DE VARIABLES
@@ -473,11 +481,11 @@ class ViperParser:
 
             if self.symbol_table._scope == "Type Definition":
                 # SI ESTAS EN UNA DECLARACION DE TIPO
-                SemanticError.print_sem_error("Type Declaration Error", variables)
+                SemanticError.report(ErrorCode.TYPE_DECLARATION, variables)
 
             if self.symbol_table._scope.__contains__("FUNCTIONDECL"):
-                SemanticError.print_sem_error(
-                    "Function Declaration Error",
+                SemanticError.report(
+                    ErrorCode.FUNCTION_DECLARATION,
                     [self.symbol_table._scope.split("-")[1], variables],
                 )
 
@@ -487,30 +495,26 @@ class ViperParser:
                 function = self.symbol_table.lookup_function(func_name)
                 # MIRO TODAS LAS VARIABLES
                 for var in variables:
-                    if var.name in [
-                        f.name for f in function.parameters
-                    ] or var.name in [f.name for f in function.body]:
-                        SemanticError.print_sem_error(
-                            "Redefinition of Variable", [var.name, func_name]
+                    if self.symbol_table.exists_local(var.name):
+                        SemanticError.report(
+                            ErrorCode.VARIABLE_REDEFINITION, [var.name, func_name]
                         )
                     else:
                         # COMO ES SIN ASIGNACION, SIMPLEMENTE SE AÑADE A LA LISTA DEL BODY SI COINCIDEN EN TIPO
-                        local_var_table = SymbolTable()
-                        for var2 in function.parameters + function.body:
-                            local_var_table.add_variable(var2)
                         type = variables[-1].value.infer_type(
-                            local_var_table, self.record_table
+                            self.symbol_table, self.record_table
                         )
 
                         if not self._compatible(datatype, type):
-                            SemanticError.print_sem_error(
-                                "Incompatible Types Func",
+                            SemanticError.report(
+                                ErrorCode.INCOMPATIBLE_TYPES_FUNC,
                                 [datatype, type, variables, func_name],
                             )
                         else:
                             var.datatype = datatype
                             var.value = type
                             function.body.append(var)
+                            self.symbol_table.add_local(var)
 
                 self.symbol_table._functions[func_name].body = function.body
                 p[0] = variables
@@ -519,8 +523,8 @@ class ViperParser:
             type = variables[-1].value.infer_type(self.symbol_table, self.record_table)
 
             if not self._compatible(type, datatype) and type != SemanticError:
-                SemanticError.print_sem_error(
-                    "Incompatible Types", [datatype, type, variables]
+                SemanticError.report(
+                    ErrorCode.INCOMPATIBLE_TYPES, [datatype, type, variables]
                 )
                 p[0] = variables
                 return None
@@ -534,7 +538,7 @@ class ViperParser:
                             self.symbol_table._scope == "statement"
                             and not self.symbol_table.exists_variable(var.name)
                         )
-                        else  SemanticError.print_sem_error("Redefinition of Variable", [var.name])
+                        else  SemanticError.report(ErrorCode.VARIABLE_REDEFINITION, [var.name])
                     )
         else:
             if self.symbol_table._scope.__contains__("FUNCTIONBODY"):
@@ -543,11 +547,9 @@ class ViperParser:
                 function = self.symbol_table.lookup_function(func_name)
                 # MIRO TODAS LAS VARIABLES
                 for var in variables:
-                    if var.name in [
-                        f.name for f in function.parameters
-                    ] or var.name in [f.name for f in function.body]:
-                        SemanticError.print_sem_error(
-                            "Redefinition of Variable FUNC", [var.name, func_name]
+                    if self.symbol_table.exists_local(var.name):
+                        SemanticError.report(
+                            ErrorCode.VARIABLE_REDEFINITION_FUNC, [var.name, func_name]
                         )
                     else:
                         # COMO ES SIN ASIGNACION, SIMPLEMENTE SE AÑADE A LA LISTA DEL BODY SI EL TIPO ES CORRECTO
@@ -560,11 +562,12 @@ class ViperParser:
                             else None
                         )
                         if var.datatype == None:
-                            SemanticError.print_sem_error(
-                                "Type Variable Declaration Error Function",
+                            SemanticError.report(
+                                ErrorCode.FUNCTION_VARIABLE_TYPE,
                                 [datatype, var.name, func_name],
                             )
                         self.symbol_table._functions[func_name].body.append(var)
+                        self.symbol_table.add_local(var)
 
                 p[0] = variables
                 return None
@@ -575,15 +578,15 @@ class ViperParser:
             ):
 
                 if self.symbol_table._scope.__contains__("FUNCTIONDECL"):
-                    SemanticError.print_sem_error(
-                        "Function Declaration Type Atribute Error",
+                    SemanticError.report(
+                        ErrorCode.FUNCTION_PARAMETER_TYPE,
                         [self.symbol_table._scope.split("-")[1], datatype, variables],
                     )
                     p[0] = variables
                     return None
                 else:
-                    SemanticError.print_sem_error(
-                        "Declaration Error", [datatype, variables]
+                    SemanticError.report(
+                        ErrorCode.DECLARATION, [datatype, variables]
                     )
                     p[0] = variables
                     return None
@@ -594,8 +597,8 @@ class ViperParser:
                         (
                             self.symbol_table.add_variable(var)
                             if not self.symbol_table.exists_variable(var.name)
-                            else SemanticError.print_sem_error(
-                                "Redefinition of Variable",
+                            else SemanticError.report(
+                                ErrorCode.VARIABLE_REDEFINITION,
                                 [var.name],
                             )
                         )
@@ -640,12 +643,13 @@ class ViperParser:
             init = p[2]
             # p[0] = (name, init)
             p[0] = Variable(name, None, init)
+            p[0].init = init
         else:
             size = p[2]
             name = p[4]
             p[0] = Vector(name, None, size, None)
             if p[0].length == None:
-                SemanticError.print_sem_error("Vector length error", [name, size])
+                SemanticError.report(ErrorCode.VECTOR_LENGTH, [name, size])
             p[0].datatype = None
             return p[0]
 
@@ -668,25 +672,21 @@ class ViperParser:
         """
         # Tenemos que comprobar que la expresión del if sea de tipo booleano
         check_cond = p[2]
+        p[0] = p[2]
         if not self.symbol_table._scope.__contains__("FUNCTIONBODY"):
-            if check_cond.infer_type(self.symbol_table, self.record_table) != "bool":
-                SemanticError.print_sem_error(
-                    "IF COND ERROR", [check_cond, self.symbol_table, self.record_table]
-                )
+            # El error guarda el tipo ya inferido: no se vuelve a inferir al mostrarlo
+            cond_type = check_cond.infer_type(self.symbol_table, self.record_table)
+            if cond_type is not BOOL:
+                SemanticError.report(ErrorCode.IF_CONDITION, [cond_type])
                 return None
             else:
                 return None
         else:
             func_name = self.symbol_table._scope.split("-")[1]
-            function = self.symbol_table.lookup_function(func_name)
-            list_variables = SymbolTable()
-            for var2 in function.body + function.parameters:
-                list_variables.add_variable(var2)
-            check_cond = p[2].infer_type(list_variables, self.record_table)
-            if check_cond != "bool":
-                SemanticError.print_sem_error(
-                    "IF COND ERROR FUNC",
-                    [check_cond, list_variables, self.record_table, func_name],
+            check_cond = p[2].infer_type(self.symbol_table, self.record_table)
+            if check_cond is not BOOL:
+                SemanticError.report(
+                    ErrorCode.IF_CONDITION_FUNC, [check_cond, func_name]
                 )
                 return None
             else:
@@ -697,33 +697,29 @@ class ViperParser:
         if_statement : if_statement_header LBRACE NEWLINE sentence_list RBRACE
                      | if_statement_header LBRACE NEWLINE sentence_list RBRACE ELSE COLON LBRACE NEWLINE sentence_list RBRACE
         """
+        # La cabecera devuelve la condición
+        p[0] = IfStatement(p[1], p[4], p[10] if len(p) == 12 else [])
 
     def p_while_header(self, p):
         """
         while_header : WHILE expression COLON
         """
         check_cond = p[2]
+        p[0] = p[2]
 
         if not self.symbol_table._scope.__contains__("FUNCTIONBODY"):
-            if check_cond.infer_type(self.symbol_table, self.record_table) != "bool":
-                SemanticError.print_sem_error(
-                    "WHILE COND ERROR",
-                    [check_cond, self.symbol_table, self.record_table],
-                )
+            cond_type = check_cond.infer_type(self.symbol_table, self.record_table)
+            if cond_type is not BOOL:
+                SemanticError.report(ErrorCode.WHILE_CONDITION, [cond_type])
                 return None
             else:
                 return None
         else:
             func_name = self.symbol_table._scope.split("-")[1]
-            function = self.symbol_table.lookup_function(func_name)
-            list_variables = SymbolTable()
-            for var2 in function.body + function.parameters:
-                list_variables.add_variable(var2)
-            check_cond = p[2].infer_type(list_variables, self.record_table)
-            if check_cond != "bool":
-                SemanticError.print_sem_error(
-                    "WHILE COND ERROR FUNC",
-                    [check_cond, list_variables, self.record_table, func_name],
+            check_cond = p[2].infer_type(self.symbol_table, self.record_table)
+            if check_cond is not BOOL:
+                SemanticError.report(
+                    ErrorCode.WHILE_CONDITION_FUNC, [check_cond, func_name]
                 )
                 return None
             else:
@@ -733,6 +729,7 @@ class ViperParser:
         """
         while_statement : while_header LBRACE NEWLINE sentence_list RBRACE
         """
+        p[0] = WhileStatement(p[1], p[4])
 
     def p_type_definition(self, p):
         """
@@ -758,8 +755,8 @@ class ViperParser:
                     fields.append(elems)
                 else:
                     if not elems.datatype == None:
-                        SemanticError.print_sem_error(
-                            "Redeclaration of Type Attr", [elems.name, type_name]
+                        SemanticError.report(
+                            ErrorCode.ATTRIBUTE_REDECLARATION, [elems.name, type_name]
                         )
         # Solo se guarda si todos los elementos de fields declared se han guardado en fields, esto quiere decir
         # QUE TODOS LOS ATRIBUTOS DECLARADOS SON CORRECTOS
@@ -768,7 +765,7 @@ class ViperParser:
             if len(fields) == number_of_attr
             else None
         )
-        p[0] = ("type_definition", p[2])
+        p[0] = TypeDefinition(type_name, fields)
 
     # FUNCION QUE PERMITE CAMBIAR EL SCOPE A TYPE_DEFINITION
     def p_type_definition_header(self, p):
@@ -776,7 +773,7 @@ class ViperParser:
         type_definition_header : TYPE ID COLON LBRACE NEWLINE
         """
         self.symbol_table._scope = "Type Definition"
-        p[0] = p[2]
+        p[0] = named_type(p[2])
 
     def p_type_definition_body(self, p):
         """
@@ -789,6 +786,9 @@ class ViperParser:
         function_header : DEF function_type ID
         """
         self.symbol_table._scope = f"FUNCTIONDECL-{p[3]}"
+        # Las funciones no se anidan: si una definición anterior quedó sin
+        # cerrar por un error sintáctico, se descarta su ámbito local
+        self.symbol_table.clear_scopes()
         p[0] = ("function_header", p[2], p[3])
 
     def p_function_header_and_parameters(self, p):
@@ -808,14 +808,15 @@ class ViperParser:
             type_funct not in self.record_table._basic_symbols
             and self.record_table.exists(type_funct) == False
         ):
-            SemanticError.print_sem_error(
-                "Function Type Declaration Error", [name_funct, type_funct]
+            SemanticError.report(
+                ErrorCode.FUNCTION_TYPE, [name_funct, type_funct]
             )
-            new_function = Function(name_funct, None, arg_list, "NoneType")
+            new_function = Function(name_funct, None, arg_list, NONE)
         else:
             new_function = Function(name_funct, type_funct, arg_list, type_funct)
         self.symbol_table.add_function(new_function)
         self.symbol_table._scope = f"FUNCTIONBODY-{name_funct}"
+        self.symbol_table.push_scope(self.symbol_table.lookup_function(name_funct))
 
     def p_function_definition(self, p):
         """
@@ -825,24 +826,23 @@ class ViperParser:
 
         funct_name = self.symbol_table._scope.split("-")[1]
         function = self.symbol_table.lookup_function(funct_name)
-        local_var_table = SymbolTable()
-        for var in function.body + function.parameters:
-            local_var_table.add_variable(var)
 
         result = (
-            return_statement.infer_type(local_var_table, self.record_table)
+            return_statement.infer_type(self.symbol_table, self.record_table)
             if return_statement != None
             else None
         )
         if result == None:
-            result = "NoneType"
-        if result.upper() != function.return_type.upper():
-            SemanticError.print_sem_error(
-                "Incompatible Types Func Ret",
+            result = NONE
+        if result is not function.return_type:
+            SemanticError.report(
+                ErrorCode.INCOMPATIBLE_RETURN,
                 [function.return_type, result, funct_name],
             )
 
         self.symbol_table._scope = ""
+        self.symbol_table.pop_scope()
+        p[0] = FunctionDefinition(function, p[2], return_statement)
 
     def p_newlines(self, p):
         """
@@ -865,7 +865,7 @@ class ViperParser:
                       | CHAR_TYPE
                       | ID
         """
-        p[0] = p[1]
+        p[0] = named_type(p[1])
 
     def p_argument_list(self, p):
         """
@@ -885,57 +885,138 @@ class ViperParser:
     # ------------------------------------------------------------------
     def p_error(self, p):
         if p:
-            # Obtener línea exacta usando la posición del token
-            line_start = p.lexer.lexdata.rfind("\n", 0, p.lexpos) + 1
-            line_end = p.lexer.lexdata.find("\n", p.lexpos)
-            line = p.lexer.lexdata[line_start:line_end]
-            line_num = p.lineno
-            # No entendemos por qué hay que dividirlo entre dos para obtener la
-            # línea. Fue una idea feliz que funcionó épicamente.
-            print(f"Error sintáctico en línea:")
-            print(f">>> {line}")
-            print(f"    {' ' * (p.lexpos - line_start)}^")
+            # Línea y columna del token con el índice de líneas de la entrada
+            index = self._line_index(p.lexer)
+            line_num, column = index.position(p.lexpos, p.lineno)
+            line = index.line_text(line_num)
+            location = self.location(p.lineno)
+            if location is not None:
+                location = (*location, column + 1)
+            self.diagnostics.report(ErrorCode.SYNTAX_ERROR, (line, column), location)
         else:
-            print("Error sintáctico al final del archivo.")
+            self.diagnostics.report(ErrorCode.UNEXPECTED_EOF)
 
-    def build(self, **kwargs):
+    def build(self, optimize: bool = False, **kwargs):
         """
         Construye el parser con ply.yacc, usando las reglas definidas.
+        Con optimize se cargan las tablas LALR precalculadas de la caché
+        (invalidadas por el hash de la gramática) sin escribir parser.out.
         """
-        self.parser = yacc.yacc(module=self, debug=True, **kwargs)
+        if not optimize:
+            self.parser = yacc.yacc(module=self, debug=True, **kwargs)
+            return
 
-    def parse(self):
+        digest = grammar_hash(self, "p_", extra=("tokens", "precedence"))
+        self.parser = yacc.yacc(
+            module=self,
+            debug=False,
+            optimize=True,
+            picklefile=table_path("parsetab", digest, ".pickle"),
+            errorlog=yacc.NullLogger(),
+            **kwargs,
+        )
+
+    def location(self, lineno):
         """
-        Realiza el análisis sintáctico (parse) sobre el 'input_data'
-        y retorna el árbol resultante (o None si hay error).
+        (fichero, línea) original de la línea lineno de la entrada si se ha
+        preprocesado, o None si la entrada es el propio fichero.
         """
-        if not self.parser:
-            self.build()
+        if self.lexer.source_map is None:
+            return None
+        return self.lexer.source_map.locate_line(lineno)
+
+    def _line_index(self, lexer):
+        """
+        Índice de líneas del texto del lexer de un token; se construye una sola
+        vez por entrada (o por trozo, con TokenStream)
+        """
+        text = lexer.lexdata
+        if self._lines is None or self._lines.text is not text:
+            self._lines = LineIndex(text, getattr(lexer, "lexoffset", 0))
+        return self._lines
+
+    def _tracking_tokens(self, source):
+        """Función de tokens que apunta en _last_token el último leído"""
+        self._last_token = None
 
-        with open(self.route, "r") as file:
-            input_data = file.read()
+        def token():
+            token = source.token()
+            if token is not None:
+                self._last_token = token
+            return token
 
-        if not input_data.endswith("\n"):
-            input_data += "\n"
+        return token
 
-        if not input_data.startswith("\n"):
-            input_data = "\n" + input_data
+    def _semantic_location(self):
+        """(fichero, línea, columna) originales del último token leído"""
+        token = self._last_token
+        if token is None:
+            return None
+        file, line = self.location(token.lineno)
+        index = self._line_index(token.lexer)
+        end = index.offset + len(index.text)
+        _, column = index.position(min(token.lexpos, end), token.lineno)
+        return file, line, column + 1
 
-        result = self.parser.parse(input_data, lexer=self.lexer.lexer)
+    def output_route(self, extension):
+        """Ruta del artefacto con la extensión dada para el fichero actual"""
+        return f"{self.route.replace(".postprocessed", "").replace(".vip", "")}.{extension}"
 
-        # Exportamos las tablas
-        with open(
-            f"{self.route.replace(".postprocessed", "").replace(".vip", "")}.symbol",
-            "w",
-        ) as file:
-            for symbol in self.symbol_table._variables:
-                file.write(f"{self.symbol_table._variables[symbol]}\n")
+    def parse(self):
+        """
+        Realiza el análisis sintáctico (parse) sobre el 'input_data'
+        y retorna el árbol resultante (o None si hay error).
+        """
+        if not self.parser:
+            self.build()
 
-        with open(
-            f"{self.route.replace(".postprocessed", "").replace(".vip", "")}.record",
-            "w",
-        ) as file:
-            for symbol in self.record_table._table:
-                file.write(f"{symbol} => {self.record_table._table[symbol]}\n")
+        if self.lexer.token_buffer is not None:
+            # Los tokens ya se generaron en ViperLexer.run(), no hace falta
+            # volver a leer ni a tokenizar el fichero
+            input_data, source = None, self.lexer.token_buffer
+        else:
+            if self.lexer.preprocessed is not None:
+                input_data = self.lexer.preprocessed
+            else:
+                with open(self.route, "r") as file:
+                    input_data = file.read()
+
+            if not input_data.endswith("\n"):
+                input_data += "\n"
+
+            # Se vuelve a tokenizar desde el principio: las líneas se cuentan
+            # desde 1 sin contar el salto de línea que añadimos delante
+            self.lexer.lexer.lineno = 1
+            if not input_data.startswith("\n"):
+                input_data = "\n" + input_data
+                self.lexer.lexer.lineno = 0
+            source = self.lexer.lexer
+
+        tokenfunc = None
+        SemanticError.diagnostics = self.diagnostics
+        if self.lexer.source_map is not None:
+            # Los errores semánticos se sitúan en la línea del último token leído
+            tokenfunc = self._tracking_tokens(source)
+            SemanticError.locate = self._semantic_location
+        try:
+            result = self.parser.parse(input_data, lexer=source, tokenfunc=tokenfunc)
+        finally:
+            # También si el análisis falla: se completa el .token y se
+            # exportan las tablas con lo que tengan hasta ese punto
+            if isinstance(source, (TokenStream, BinaryTokenReader)):
+                source.close()
+
+            # Exportamos las tablas
+            with open(self.output_route("symbol"), "w") as file:
+                for symbol in self.symbol_table._variables:
+                    file.write(f"{self.symbol_table._variables[symbol]}\n")
+
+            with open(self.output_route("record"), "w") as file:
+                for symbol in self.record_table._table:
+                    file.write(f"{symbol} => {self.record_table._table[symbol]}\n")
+
+            SemanticError.diagnostics = SemanticError.locate = None
+            # Todos los errores de la compilación se escriben de una vez
+            print(self.diagnostics.render(), end="")
 
         return result
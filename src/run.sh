@@ -4,6 +4,50 @@ GREEN="\033[32m"
 RESET="\033[0m"
 BLUE="\033[34m"
 
+# Con --diff-scanner solo se comprueba que el escáner escrito a mano da los
+# mismos tokens que el lexer de PLY en cada prueba
+if [ "$1" == "--diff-scanner" ]; then
+    python3 scanner.py test_files/input/*.vip
+    exit $?
+fi
+
+# Con --run se ejecutan con main.py --run las pruebas que tienen salida
+# esperada (.run) y se compara lo que muestran
+if [ "$1" == "--run" ]; then
+    shift
+    for expected_file in test_files/expected/*.run; do
+        base_name=$(basename "$expected_file" .run)
+        if cmp -s "$expected_file" <(python3 main.py --run "$@" "test_files/input/${base_name}.vip" 2>&1); then
+            echo -e "Test $base_name (run): ${GREEN}SUCCESS${RESET}"
+        else
+            echo -e "Test $base_name (run): ${RED}FAIL${RESET}"
+        fi
+        rm -f test_files/input/${base_name}.{token,symbol,record}
+    done
+    exit 0
+fi
+
+# Con --stream-chunks se compila cada prueba con --stream y trozos de 1, 7 y
+# 64 bytes y se comparan su .token y su .error (con las posiciones de los
+# errores sintácticos) con los esperados
+if [ "$1" == "--stream-chunks" ]; then
+    for size in 1 7 64; do
+        for input_file in test_files/input/*.vip; do
+            base_name=$(basename "$input_file" .vip)
+            output="test_files/input/${base_name}"
+            python3 main.py --stream --chunk-size "$size" "$input_file" > "${output}.error" 2>&1
+            if cmp -s "test_files/expected/${base_name}.token" "${output}.token" &&
+                cmp -s "test_files/expected/${base_name}.error" "${output}.error"; then
+                echo -e "Test $base_name (stream $size): ${GREEN}SUCCESS${RESET}"
+            else
+                echo -e "Test $base_name (stream $size): ${RED}FAIL${RESET}"
+            fi
+            rm -f "${output}".{token,symbol,record,error}
+        done
+    done
+    exit 0
+fi
+
 mkdir -p test_files/output
 
 # Borramos todos los ficheros de output
@@ -32,10 +76,13 @@ run_test() {
     local expected_symbol="test_files/expected/${base_name}.symbol"
     local expected_record="test_files/expected/${base_name}.record"
 
-    # Ejecutar el compilador y redirigir la salida estándar de error
-    python3 main.py "$input_file" > "$output_error" 2>&1
+    # Ejecutar el compilador y redirigir la salida estándar de error. En modo
+    # batch ya se han compilado todos los ficheros y el .error está generado.
+    if [ "$BATCH" != "1" ]; then
+        python3 main.py "${MAIN_ARGS[@]}" "$input_file" > "$output_error" 2>&1
+    fi
 
-    for ext in token symbol record; do
+    for ext in token symbol record error; do
         src="test_files/input/${base_name}.${ext}"
         dst="test_files/output/${base_name}.${ext}"
         [ -f "$src" ] && mv "$src" "$dst"
@@ -59,6 +106,23 @@ echo ""
 echo "EJECUTANDO TESTS"
 echo ""
 
+# Con --batch se compilan todas las pruebas en un único proceso y con
+# --jobs N se reparten entre N procesos. El resto de opciones se pasan a main.py
+BATCH=0
+MAIN_ARGS=()
+while [ $# -gt 0 ]; do
+    case "$1" in
+        --batch) BATCH=1 ;;
+        --jobs) BATCH=1; MAIN_ARGS+=(--jobs "$2"); shift ;;
+        *) MAIN_ARGS+=("$1") ;;
+    esac
+    shift
+done
+
+if [ "$BATCH" == "1" ]; then
+    python3 main.py --batch "${MAIN_ARGS[@]}" test_files/input > /dev/null
+fi
+
 for input_file in test_files/input/*.vip; do
     run_test "$input_file"
 done
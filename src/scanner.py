@@ -0,0 +1,240 @@
+# scanner.py
+# Escáner escrito a mano, alternativo al lexer de PLY (ViperLexer con
+# fast_scanner). En lugar de probar la expresión maestra de PLY y llamar a la
+# función de la regla en cada token, decide por el primer carácter qué clase
+# de token empieza ahí y solo aplica la expresión de esa clase.
+# Produce exactamente los mismos tokens (tipo, valor, línea y posición).
+# Uso: python3 scanner.py <ficheros .vip>  compara ambos lexers token a token
+import re
+import string
+import sys
+
+import ply.lex as lex
+
+from tokenfile import Token
+
+# Clases de token según el primer carácter
+IGNORE, NAME, NUMBER, QUOTE, COMMENT, NEWLINE, OPERATOR = range(7)
+
+
+def comment_end(text, start):
+    """
+    Posición siguiente al ''' que cierra el comentario multilínea abierto en
+    start, o -1 si no se cierra. Se busca con str.find (sin retroceso), así
+    que el coste es lineal en la longitud del comentario.
+    """
+    close = text.find("'''", start + 3)
+    return -1 if close == -1 else close + 3
+
+
+class FastScanner:
+    """
+    Lexer con la misma interfaz que el de PLY (input, token, lineno, lexpos,
+    lexdata y skip), así que se puede usar en su lugar en ViperLexer, en los
+    buffers de tokens y en yacc.parse. Las expresiones regulares, las
+    palabras reservadas y los operadores se toman de las reglas t_ del
+    ViperLexer que recibe, de modo que ambos lexers no pueden divergir.
+    """
+
+    def __init__(self, rules):
+        # rules: el ViperLexer, al que también se pasan los errores (t_error)
+        self.rules = rules
+        self.lineno = 1
+        self.lexpos = 0
+        self.lexdata = ""
+        self._tokens = iter(())
+
+        # PLY compila las reglas con re.VERBOSE
+        self._float = re.compile(rules.t_FLOAT.__doc__, re.VERBOSE)
+        self._int = re.compile(rules.t_INT.__doc__, re.VERBOSE)
+        self._char = re.compile(rules.t_CHAR.__doc__, re.VERBOSE)
+        self._name = re.compile(rules.t_ID.__doc__, re.VERBOSE)
+        self._reserved = rules.reserved
+
+        # Operadores: texto -> tipo, a partir de las reglas que son cadenas
+        self._operators = {}
+        for name in rules.tokens:
+            pattern = getattr(rules, f"t_{name}", None)
+            if isinstance(pattern, str):
+                self._operators[re.sub(r"\\(.)", r"\1", pattern)] = name
+        # Los de dos caracteres tienen prioridad (PLY prueba antes las
+        # expresiones más largas)
+        self._pairs = {op for op in self._operators if len(op) == 2}
+
+        # Primer carácter -> clase de token (los que no están son ilegales)
+        self._dispatch = {
+            **dict.fromkeys(rules.t_ignore, IGNORE),
+            **dict.fromkeys(string.ascii_letters + "_", NAME),
+            **dict.fromkeys(string.digits, NUMBER),
+            **dict.fromkeys((op[0] for op in self._operators), OPERATOR),
+            "'": QUOTE,
+            "#": COMMENT,
+            "\n": NEWLINE,
+        }
+
+    def input(self, data):
+        self.lexdata = data
+        self.lexpos = 0
+        self._tokens = self._scan(data)
+
+    def token(self):
+        return next(self._tokens, None)
+
+    def skip(self, n):
+        self.lexpos += n
+
+    def _scan(self, data):
+        dispatch, operators, pairs = self._dispatch, self._operators, self._pairs
+        reserved = self._reserved
+        match_float, match_int = self._float.match, self._int.match
+        match_char, match_name = self._char.match, self._name.match
+        # Con raw_literals los números se entregan como texto (ver TokenBuffer)
+        raw_literals = self.rules.raw_literals
+        size = len(data)
+        pos = 0
+        lineno = self.lineno
+
+        while pos < size:
+            kind = dispatch.get(data[pos])
+            newlines = 0
+
+            if kind == NAME:
+                end = match_name(data, pos).end()
+                value = data[pos:end]
+                token_type = reserved.get(value, "ID")
+            elif kind == IGNORE:
+                pos += 1
+                continue
+            elif kind == NEWLINE:
+                end = pos + 1
+                while end < size and data[end] == "\n":
+                    end += 1
+                token_type, value = "NEWLINE", "nl"
+                newlines = end - pos
+            elif kind == OPERATOR:
+                value = data[pos : pos + 2]
+                if value not in pairs:
+                    value = data[pos]
+                end = pos + len(value)
+                token_type = operators[value]
+            elif kind == NUMBER:
+                match = match_float(data, pos)
+                if match is not None:
+                    end = match.end()
+                    token_type, value = "FLOAT", data[pos:end]
+                    if not raw_literals:
+                        value = float(value)
+                else:
+                    end = match_int(data, pos).end()
+                    token_type, value = "INT", data[pos:end]
+                    if not raw_literals:
+                        # Los prefijos 0x, 0b y 0o son los de Python
+                        value = int(value, 0)
+            elif kind == COMMENT:
+                end = data.find("\n", pos)
+                pos = size if end == -1 else end
+                continue
+            elif kind == QUOTE and data.startswith("'''", pos):
+                end = comment_end(data, pos)
+                if end != -1:
+                    lineno += data.count("\n", pos, end)
+                    self.lineno = lineno
+                    pos = end
+                    continue
+                # Sin cierre: como en t_MULTICOMMENT
+                end = pos + 3
+                token_type, value = "CHAR", "'"
+            else:
+                match = match_char(data, pos) if kind == QUOTE else None
+                if match is None:
+                    pos = self._error(data, pos, lineno)
+                    continue
+                end = match.end()
+                token_type, value = "CHAR", data[pos + 1 : end - 1]
+
+            token = Token()
+            token.type = token_type
+            token.value = value
+            token.lineno = lineno
+            token.lexpos = pos
+            token.lexer = self
+            if newlines:
+                lineno += newlines
+                self.lineno = lineno
+            pos = self.lexpos = end
+            yield token
+
+        self.lexpos = size
+
+    def _error(self, data, pos, lineno):
+        """Pasa el carácter ilegal a t_error y devuelve dónde seguir"""
+        token = Token()
+        token.type = "error"
+        # t_error solo usa el primer carácter; PLY le pasa el resto de la entrada
+        token.value = data[pos]
+        token.lineno = lineno
+        token.lexpos = pos
+        token.lexer = self
+        self.lexpos = pos
+        self.rules.t_error(token)
+        if self.lexpos == pos:
+            raise lex.LexError(
+                f"Scanning error. Illegal character {data[pos]!r}", data[pos:]
+            )
+        return self.lexpos
+
+
+def differences(path):
+    """
+    Tokeniza path con el lexer de PLY y con FastScanner y devuelve la lista
+    de diferencias (vacía si ambos producen los mismos tokens y errores).
+    """
+    from lexer import ViperLexer
+
+    with open(path, "r") as file:
+        content = file.read()
+
+    streams = []
+    for fast_scanner in (False, True):
+        viper_lexer = ViperLexer(path, fast_scanner=fast_scanner)
+        viper_lexer.build(optimize=True)
+        viper_lexer.lexer.input(content)
+        viper_lexer.lexer.lineno = 1
+        tokens = [
+            (token.type, token.value, token.lineno, token.lexpos)
+            for token in iter(viper_lexer.lexer.token, None)
+        ]
+        errors = viper_lexer.diagnostics.render()
+        streams.append((tokens, viper_lexer.lexer.lineno, errors))
+
+    (ply_tokens, ply_lines, ply_errors), (fast_tokens, fast_lines, fast_errors) = (
+        streams
+    )
+    found = []
+    for index, (expected, got) in enumerate(zip(ply_tokens, fast_tokens)):
+        # 1 y 1.0 son iguales con ==, por eso se compara también el tipo
+        if expected != got or type(expected[1]) is not type(got[1]):
+            found.append(f"token {index}: PLY {expected}, FastScanner {got}")
+            break
+    if len(ply_tokens) != len(fast_tokens):
+        found.append(f"PLY {len(ply_tokens)} tokens, FastScanner {len(fast_tokens)}")
+    if ply_lines != fast_lines:
+        found.append(f"línea final: PLY {ply_lines}, FastScanner {fast_lines}")
+    if ply_errors != fast_errors:
+        found.append("errores léxicos distintos")
+    return found
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python3 scanner.py <file.vip>...")
+        exit(1)
+
+    failed = 0
+    for path in sys.argv[1:]:
+        found = differences(path)
+        failed += bool(found)
+        print(f"{path}: {'FAIL' if found else 'SUCCESS'}")
+        for difference in found:
+            print(f"\t{difference}")
+    exit(1 if failed else 0)
@@ -0,0 +1,94 @@
+# sourcemap.py
+# Posiciones en el fuente para los mensajes de error: índice de líneas de un
+# texto y mapa del fichero preprocesado a los ficheros y líneas originales,
+# para que los errores señalen dónde se escribió el código y no dónde acabó
+# tras expandir %append.
+import re
+from array import array
+from bisect import bisect_right
+
+
+class LineIndex:
+    """
+    Índice de los inicios de línea de text, construido una sola vez. Traduce
+    una posición a (línea, columna) y devuelve el texto de cualquier línea.
+    Si se conoce la línea del token (lineno), se comprueba directamente y la
+    consulta es O(1); si no coincide, se hace una búsqueda binaria.
+    text puede ser un fragmento de la entrada que empieza en offset (un trozo
+    de TokenStream); las posiciones que recibe son siempre de la entrada.
+    """
+
+    def __init__(self, text, offset=0):
+        self.text = text
+        self.offset = offset
+        self._starts = array("Q", [0])
+        self._starts.extend(match.end() for match in re.finditer("\n", text))
+
+    def line_of(self, offset, hint=None):
+        """Línea (empezando en 1, desde el inicio de text) en la que está offset"""
+        offset -= self.offset
+        starts = self._starts
+        if hint is not None and 0 < hint <= len(starts):
+            if starts[hint - 1] <= offset and (
+                hint == len(starts) or offset < starts[hint]
+            ):
+                return hint
+        return bisect_right(starts, offset)
+
+    def position(self, offset, hint=None):
+        """(línea, columna) de offset; la línea empieza en 1 y la columna en 0"""
+        line = self.line_of(offset, hint)
+        return line, offset - self.offset - self._starts[line - 1]
+
+    def line_text(self, line):
+        """Texto de la línea line, sin el salto de línea"""
+        start = self._starts[line - 1]
+        if line < len(self._starts):
+            return self.text[start : self._starts[line] - 1]
+        return self.text[start:]
+
+
+class SourceMap:
+    """
+    Se construye a partir del contenido preprocesado y de sus segmentos:
+    tramos de líneas consecutivas que proceden de un mismo fichero, dados
+    como (línea del preprocesado empezando en 0, fichero, línea original).
+
+    Todo se guarda en arrays ordenados: el inicio de cada línea del
+    preprocesado (un LineIndex) y, por segmento, su primera línea, su
+    fichero (índice en files) y su línea original. Una consulta son una o
+    dos búsquedas binarias, O(log n).
+    """
+
+    def __init__(self, content, segments):
+        self.lines = LineIndex(content)
+
+        self.files = []
+        file_ids = {}
+        self._segment_lines = array("I")
+        self._segment_files = array("I")
+        self._segment_origins = array("I")
+        for line, path, origin in segments:
+            file_id = file_ids.get(path)
+            if file_id is None:
+                file_id = file_ids[path] = len(self.files)
+                self.files.append(path)
+            self._segment_lines.append(line + 1)
+            self._segment_files.append(file_id)
+            self._segment_origins.append(origin)
+
+    def line_of(self, offset):
+        """Línea (empezando en 1) del preprocesado en la que está offset"""
+        return self.lines.line_of(offset)
+
+    def locate_line(self, lineno):
+        """(fichero, línea) original de la línea lineno del preprocesado"""
+        index = bisect_right(self._segment_lines, lineno) - 1
+        if index < 0:
+            return None
+        origin = self._segment_origins[index] + lineno - self._segment_lines[index]
+        return self.files[self._segment_files[index]], origin
+
+    def locate(self, offset):
+        """(fichero, línea) original de la posición offset del preprocesado"""
+        return self.locate_line(self.line_of(offset))
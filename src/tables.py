@@ -1,22 +1,90 @@
+from itertools import count
+
+from datatypes import BOOL, CHAR, FLOAT, INT, PRIMITIVES
+from diagnostics import ErrorCode
 from exception import SemanticError
+from objects import Record, Vector
+
+# Tamaño en bytes de los tipos básicos
+BASIC_SIZES = {INT: 4, FLOAT: 8, CHAR: 1, BOOL: 1}
+
+# Generaciones de ámbito, únicas entre todas las tablas de símbolos
+_generations = count()
+
 
 class Recordtable:
     def __init__(self):
-        # mapea nombre de record -> Record
+        # mapea tipo del record (datatypes.RecordType) -> Record
         self._table = {}
-        self._basic_symbols = ("int", "float", "char", "bool")
+        self._basic_symbols = PRIMITIVES
+        # Caché de rutas: (tipo, (campo1, campo2, ...)) -> campo final o None
+        self._paths = {}
 
     def add_record(self, type_name, fields):
         """Añade una definición de Record.
-        record: instancia de objects.Record"""
+        fields: lista de Variable/Vector con los atributos del tipo"""
 
         if type_name in self._table:
-            return SemanticError.print_sem_error("Type Redefinition Error", [type_name])
-        self._table[type_name] = fields
+            return SemanticError.report(ErrorCode.TYPE_REDEFINITION, [type_name])
+
+        record = Record(type_name, {field.name: field for field in fields})
+        offset = 0
+        for field in fields:
+            size = self.size_of(field)
+            record.offsets[field.name] = offset
+            record.sizes[field.name] = size
+            offset = None if offset is None or size is None else offset + size
+        record.size = offset
+
+        self._table[type_name] = record
+        # Un tipo nuevo puede hacer válidas rutas que antes no lo eran
+        self._paths.clear()
+
+    def size_of(self, field):
+        """Tamaño en bytes de un atributo, o None si no se puede calcular"""
+        if field.datatype in BASIC_SIZES:
+            size = BASIC_SIZES[field.datatype]
+        elif field.datatype in self._table:
+            size = self._table[field.datatype].size
+        else:
+            return None
+
+        if isinstance(field, Vector):
+            length = field.type.length
+            if not isinstance(length, int) or size is None:
+                return None
+            size *= length
+        return size
+
+    def lookup_field(self, type_name, field_name):
+        """Devuelve el atributo field_name del tipo type_name o None"""
+        record = self._table.get(type_name)
+        return record.fields.get(field_name) if record else None
+
+    def resolve(self, type_name, path):
+        """Devuelve el atributo al que lleva la ruta de campos `path` (tupla)
+        partiendo del tipo type_name, o None si la ruta no es válida.
+        Los resultados se memorizan por (tipo, ruta)."""
+        key = (type_name, path)
+        if key in self._paths:
+            return self._paths[key]
+
+        if len(path) > 1:
+            parent = self.resolve(type_name, path[:-1])
+            field = (
+                self.lookup_field(parent.datatype, path[-1])
+                if parent is not None
+                else None
+            )
+        else:
+            field = self.lookup_field(type_name, path[0])
+
+        self._paths[key] = field
+        return field
 
 
     def lookup(self, name):
-        """Devuelve el Record con ese nombre o None si no existe"""
+        """Devuelve el Record de ese tipo o None si no existe"""
         if self._table.get(name):
             return self._table[name]
         return None
@@ -35,6 +103,14 @@ class SymbolTable:
         self._variables = {}
         self._functions = {}
         self._scope = ""
+        # Pila de ámbitos locales. Cada ámbito es un dict nombre -> Variable
+        # que se mantiene durante todo el cuerpo de la función, así que cada
+        # búsqueda local es un único acceso al diccionario.
+        self._scopes = []
+        # Cambia cada vez que se abre o cierra un ámbito o se declara una
+        # variable: invalida los tipos que las expresiones tienen cacheados
+        # (ver objects.Expression)
+        self.generation = next(_generations)
 
     # ——— Variables ———————————————————————————————————————————
     def add_variable(self, variable):
@@ -44,6 +120,7 @@ class SymbolTable:
         if name in self._variables:
             raise SemanticError(f"Variable '{name}' ya definida")
         self._variables[name] = variable
+        self.generation = next(_generations)
 
     def lookup_variable(self, name):
         """Devuelve la Variable con ese nombre o None si no existe"""
@@ -54,15 +131,47 @@ class SymbolTable:
         return True if name in self._variables else False
 
 
+    # ——— Ámbitos locales ————————————————————————————————————
+    def push_scope(self, function):
+        """Abre el ámbito local de una función con sus parámetros y cuerpo.
+        function: instancia de objects.Function"""
+        local = {}
+        for variable in function.parameters + function.body:
+            local.setdefault(variable.name, variable)
+        self._scopes.append(local)
+        self.generation = next(_generations)
+
+    def pop_scope(self):
+        """Cierra el ámbito local actual"""
+        if self._scopes:
+            self._scopes.pop()
+            self.generation = next(_generations)
+
+    def clear_scopes(self):
+        """Descarta todos los ámbitos locales abiertos"""
+        self._scopes.clear()
+        self.generation = next(_generations)
+
+    def add_local(self, variable):
+        """Añade una Variable al ámbito local actual"""
+        self._scopes[-1].setdefault(variable.name, variable)
+        self.generation = next(_generations)
+
+    def lookup_local(self, name):
+        """Devuelve la Variable local con ese nombre o None si no existe"""
+        return self._scopes[-1].get(name) if self._scopes else None
+
+    def exists_local(self, name):
+        """Comprueba si una variable está definida en el ámbito local actual"""
+        return bool(self._scopes) and name in self._scopes[-1]
+
     # ——— Funciones ———————————————————————————————————————————
     def add_function(self, function):
         """Añade una Function.
         function: instancia de objects.Function"""
         name = function.name
         if name in self._functions:
-            print("SEMANTIC ERROR DETECTED")
-            print(SemanticError(f"\tFUNCTION '{name}' IS ALREADY DEFINED"))
-            print("")
+            SemanticError.report(ErrorCode.FUNCTION_REDEFINITION, [name])
         else:
             self._functions[name] = function
 
@@ -81,6 +190,8 @@ class SymbolTable:
         """Vací­a ambas tablas"""
         self._variables.clear()
         self._functions.clear()
+        self._scopes.clear()
+        self.generation = next(_generations)
 
     def __str__(self):
         return f"SymbolTable({self._variables}, {self._functions})"
@@ -0,0 +1,275 @@
+# tokenfile.py
+# Formato binario compacto de tokens (.tokbin), alternativo al .token de texto.
+#
+# Estructura del fichero:
+#   cabecera    b"VTOK", versión, flags (NEWLINE sintético inicial/final), nº tokens
+#   tipos       tabla de nombres de tipo internados (el id es su posición)
+#   valores     tabla de valores internados: int (zigzag), float (double) o str
+#   columnas    cuatro columnas de varints, una por campo de cada token:
+#               id de tipo, índice de valor, delta de línea y delta de posición
+# Todos los enteros (longitudes incluidas) se codifican como varint LEB128.
+import mmap
+import struct
+import sys
+
+MAGIC = b"VTOK"
+VERSION = 1
+
+# Flags de la cabecera
+LEADING_NEWLINE = 1
+TRAILING_NEWLINE = 2
+
+# Tipos de valor en la tabla de valores
+VALUE_INT = 0
+VALUE_FLOAT = 1
+VALUE_STR = 2
+
+
+def encode_varint(number, out):
+    """Añade a out (bytearray) el entero no negativo number como varint"""
+    while number >= 0x80:
+        out.append((number & 0x7F) | 0x80)
+        number >>= 7
+    out.append(number)
+
+
+def decode_varint(data, pos):
+    """Lee un varint de data en pos y devuelve (valor, nueva posición)"""
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def zigzag(number):
+    return number * 2 if number >= 0 else -number * 2 - 1
+
+
+def unzigzag(number):
+    return number >> 1 if not number & 1 else -(number >> 1) - 1
+
+
+class BinaryTokenWriter:
+    """
+    Escribe los tokens en formato .tokbin. Los tipos y los valores se
+    internan, así que cada token ocupa unos pocos bytes en las columnas.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._types = {}
+        self._values = {}
+        self._columns = [bytearray() for _ in range(4)]
+        self._count = 0
+        self._lineno = 0
+        self._lexpos = 0
+
+    def write(self, token):
+        types, values, lines, positions = self._columns
+
+        type_id = self._types.setdefault(token.type, len(self._types))
+        # El tipo forma parte de la clave: 1 y 1.0 son valores distintos
+        value_key = (type(token.value), token.value)
+        value_id = self._values.setdefault(value_key, len(self._values))
+
+        encode_varint(type_id, types)
+        encode_varint(value_id, values)
+        encode_varint(zigzag(token.lineno - self._lineno), lines)
+        encode_varint(zigzag(token.lexpos - self._lexpos), positions)
+
+        self._lineno, self._lexpos = token.lineno, token.lexpos
+        self._count += 1
+
+    def close(self, leading_newline, trailing_newline):
+        """
+        Escribe el fichero. Los flags indican si el parser debe recibir los
+        NEWLINE sintéticos del principio y del final (ver lexer.TokenBuffer).
+        """
+        out = bytearray(MAGIC)
+        out.append(VERSION)
+        out.append(
+            (LEADING_NEWLINE if leading_newline else 0)
+            | (TRAILING_NEWLINE if trailing_newline else 0)
+        )
+        encode_varint(self._count, out)
+
+        encode_varint(len(self._types), out)
+        for name in self._types:
+            self._encode_str(name, out)
+
+        encode_varint(len(self._values), out)
+        for kind, value in self._values:
+            if kind is int:
+                out.append(VALUE_INT)
+                encode_varint(zigzag(value), out)
+            elif kind is float:
+                out.append(VALUE_FLOAT)
+                out += struct.pack("<d", value)
+            else:
+                out.append(VALUE_STR)
+                self._encode_str(value, out)
+
+        for column in self._columns:
+            encode_varint(len(column), out)
+            out += column
+
+        with open(self.path, "wb") as file:
+            file.write(out)
+
+    @staticmethod
+    def _encode_str(text, out):
+        data = text.encode("utf-8")
+        encode_varint(len(data), out)
+        out += data
+
+
+class Token:
+    """
+    Token compacto con los mismos atributos que un LexToken de PLY pero sin
+    __dict__. Es el que se entrega al parser desde los buffers de tokens.
+    """
+
+    __slots__ = ("type", "value", "lineno", "lexpos", "lexer")
+
+    def __str__(self):
+        return f"LexToken({self.type},{self.value!r},{self.lineno},{self.lexpos})"
+
+
+class BinaryTokenReader:
+    """
+    Lee un .tokbin sin copiarlo: el fichero se proyecta con mmap y las
+    columnas se decodifican sobre un memoryview a medida que se piden tokens.
+    Tiene la interfaz input/token del lexer de PLY, así que se le puede pasar
+    directamente a yacc.parse (ver ViperLexer.load_tokens).
+    Si se indica el fuente, se usa como lexdata para los errores sintácticos.
+    Hay que cerrarlo (close o with) para liberar la proyección.
+    """
+
+    def __init__(self, path, source=None):
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        data = self._data = memoryview(self._mmap)
+
+        if bytes(data[:4]) != MAGIC or data[4] != VERSION:
+            data.release()
+            self._mmap.close()
+            raise ValueError(f"{path} no es un fichero .tokbin válido")
+        flags = data[5]
+        self.count, pos = decode_varint(data, 6)
+
+        size, pos = decode_varint(data, pos)
+        self.types = []
+        for _ in range(size):
+            name, pos = self._decode_str(data, pos)
+            self.types.append(name)
+
+        size, pos = decode_varint(data, pos)
+        self.values = []
+        for _ in range(size):
+            kind = data[pos]
+            if kind == VALUE_INT:
+                value, pos = decode_varint(data, pos + 1)
+                value = unzigzag(value)
+            elif kind == VALUE_FLOAT:
+                value = struct.unpack_from("<d", data, pos + 1)[0]
+                pos += 9
+            else:
+                value, pos = self._decode_str(data, pos + 1)
+            self.values.append(value)
+
+        # Posición de inicio de cada columna
+        self._cursors = []
+        for _ in range(4):
+            size, pos = decode_varint(data, pos)
+            self._cursors.append(pos)
+            pos += size
+
+        self.leading_newline = bool(flags & LEADING_NEWLINE)
+        self.trailing_newline = bool(flags & TRAILING_NEWLINE)
+        self.lexdata = ""
+        if source is not None:
+            with open(source, "r") as file:
+                self.lexdata = file.read()
+        self._tokens = self._generate()
+
+    def _generate(self):
+        data = self._data
+        types_pos, values_pos, lines_pos, positions_pos = self._cursors
+        lineno = lexpos = 0
+
+        if self.leading_newline:
+            yield self._token("NEWLINE", "nl", 1, 0)
+
+        for _ in range(self.count):
+            type_id, types_pos = decode_varint(data, types_pos)
+            value_id, values_pos = decode_varint(data, values_pos)
+            delta, lines_pos = decode_varint(data, lines_pos)
+            lineno += unzigzag(delta)
+            delta, positions_pos = decode_varint(data, positions_pos)
+            lexpos += unzigzag(delta)
+            yield self._token(
+                self.types[type_id], self.values[value_id], lineno, lexpos
+            )
+
+        if self.trailing_newline:
+            yield self._token("NEWLINE", "nl", lineno, len(self.lexdata))
+
+    def _token(self, type, value, lineno, lexpos):
+        token = Token()
+        token.type = type
+        token.value = value
+        token.lineno = lineno
+        token.lexpos = lexpos
+        token.lexer = self
+        return token
+
+    def input(self, data):
+        # Los tokens se leen del fichero; se ignora la entrada
+        pass
+
+    def token(self):
+        return next(self._tokens, None)
+
+    def close(self):
+        """Libera el memoryview y la proyección del fichero"""
+        self._tokens.close()
+        self._data.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        """Recorre solo los tokens del fichero (sin los NEWLINE sintéticos)"""
+        tokens = self._generate()
+        if self.leading_newline:
+            next(tokens)
+        for _ in range(self.count):
+            yield next(tokens)
+
+    @staticmethod
+    def _decode_str(data, pos):
+        size, pos = decode_varint(data, pos)
+        return str(data[pos : pos + size], "utf-8"), pos + size
+
+
+def to_text(binary_path, text_path):
+    """Convierte un .tokbin al formato de texto del .token"""
+    with BinaryTokenReader(binary_path) as reader, open(text_path, "w") as file:
+        for token in reader:
+            file.write(f"{token.type} {token.value}\n")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python3 tokenfile.py <file.tokbin> <file.token>")
+        exit(1)
+
+    to_text(sys.argv[1], sys.argv[2])
@@ -0,0 +1,133 @@
+# typerules.py
+# Reglas de tipos de los operadores y de la compatibilidad entre tipos en
+# asignaciones y llamadas. Se precalculan una vez en tablas densas indexadas
+# por identificadores de tipo, de modo que cada consulta es un acceso a un
+# array. Las comparten el análisis semántico y cualquier pasada posterior
+# (plegado de constantes, generación de código...).
+from array import array
+
+from datatypes import BOOL, CHAR, FLOAT, INT, PRIMITIVES
+
+# Los tipos básicos tienen los ids más bajos (ver datatypes.Type) y se usan
+# directamente como índice. El 0 representa cualquier otro tipo (registros,
+# vectores), que solo admite comparaciones con su mismo tipo y asignaciones
+# exactas.
+OTHER = 0
+TYPES_BY_ID = (None, *PRIMITIVES)
+TYPE_COUNT = len(TYPES_BY_ID)
+assert all(TYPES_BY_ID[datatype.id] is datatype for datatype in PRIMITIVES)
+
+# Valor de las tablas para una combinación no permitida
+INVALID = 0xFF
+
+ARITHMETIC = ("+", "-")
+MULTIPLICATIVE = ("*", "/")
+RELATIONAL = ("==", "!=", ">", "<", ">=", "<=")
+LOGICAL = ("and", "or")
+BINARY_OPERATORS = ARITHMETIC + MULTIPLICATIVE + RELATIONAL + LOGICAL
+BINARY_IDS = {op: op_id for op_id, op in enumerate(BINARY_OPERATORS)}
+
+UNARY_OPERATORS = ("-", "+", "not")
+UNARY_IDS = {op: op_id for op_id, op in enumerate(UNARY_OPERATORS)}
+
+# Conversiones implícitas permitidas, como pares (destino, origen)
+PROMOTIONS = {(INT, FLOAT), (CHAR, FLOAT), (CHAR, INT)}
+
+NUMERIC = (INT, FLOAT)
+
+
+def _binary_rule(op, left, right):
+    """Tipo resultado de left op right para tipos básicos, o None"""
+    if op in ARITHMETIC:
+        if left in NUMERIC and right in NUMERIC:
+            return FLOAT if FLOAT in (left, right) else INT
+        # Un char se convierte al tipo numérico del otro operando
+        if left is CHAR and right in NUMERIC:
+            return right
+        if left in NUMERIC and right is CHAR:
+            return left
+    elif op in MULTIPLICATIVE:
+        if left in NUMERIC + (CHAR,) and right in NUMERIC + (CHAR,):
+            if left in NUMERIC or right in NUMERIC:
+                return FLOAT
+    elif op in RELATIONAL:
+        if left is right:
+            return BOOL
+    elif left is BOOL and right is BOOL:
+        return BOOL
+    return None
+
+
+def _unary_rule(op, operand):
+    if op in ("-", "+") and operand in NUMERIC:
+        return operand
+    if op == "not" and operand is BOOL:
+        return BOOL
+    return None
+
+
+def _build_tables():
+    binary = array("B", [INVALID]) * (len(BINARY_OPERATORS) * TYPE_COUNT**2)
+    for op, op_id in BINARY_IDS.items():
+        for left in PRIMITIVES:
+            for right in PRIMITIVES:
+                result = _binary_rule(op, left, right)
+                if result is not None:
+                    index = (op_id * TYPE_COUNT + left.id) * TYPE_COUNT + right.id
+                    binary[index] = result.id
+
+    unary = array("B", [INVALID]) * (len(UNARY_OPERATORS) * TYPE_COUNT)
+    for op, op_id in UNARY_IDS.items():
+        for operand in PRIMITIVES:
+            result = _unary_rule(op, operand)
+            if result is not None:
+                unary[op_id * TYPE_COUNT + operand.id] = result.id
+
+    compatible = array("B", [0]) * TYPE_COUNT**2
+    for dest in PRIMITIVES:
+        for src in PRIMITIVES:
+            if dest is src or (dest, src) in PROMOTIONS:
+                compatible[dest.id * TYPE_COUNT + src.id] = 1
+
+    return binary, unary, compatible
+
+
+BINARY_RESULTS, UNARY_RESULTS, COMPATIBLE = _build_tables()
+
+
+def _index(datatype):
+    """Índice de datatype en las tablas (OTHER si no es un tipo básico)"""
+    if datatype is None or datatype.id >= TYPE_COUNT:
+        return OTHER
+    return datatype.id
+
+
+def binary_result(op, left, right):
+    """Tipo resultado de left op right, o None si la operación no es válida"""
+    op_id = BINARY_IDS.get(op)
+    left_id, right_id = _index(left), _index(right)
+    if op_id is None:
+        return None
+    if left_id and right_id:
+        result = BINARY_RESULTS[(op_id * TYPE_COUNT + left_id) * TYPE_COUNT + right_id]
+        return TYPES_BY_ID[result] if result != INVALID else None
+    # Registros y vectores solo se comparan con su mismo tipo
+    return BOOL if op in RELATIONAL and left is right else None
+
+
+def unary_result(op, operand):
+    """Tipo resultado de op operand, o None si la operación no es válida"""
+    op_id = UNARY_IDS.get(op)
+    operand_id = _index(operand)
+    if op_id is None or not operand_id:
+        return None
+    result = UNARY_RESULTS[op_id * TYPE_COUNT + operand_id]
+    return TYPES_BY_ID[result] if result != INVALID else None
+
+
+def compatible(dest, src):
+    """Indica si un valor de tipo src se puede asignar a uno de tipo dest"""
+    dest_id, src_id = _index(dest), _index(src)
+    if dest_id and src_id:
+        return bool(COMPATIBLE[dest_id * TYPE_COUNT + src_id])
+    return dest is src
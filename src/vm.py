@@ -0,0 +1,250 @@
+# vm.py
+# Máquina virtual de pila que ejecuta el bytecode de bytecode.py. Tiene la
+# misma interfaz que interpreter.Interpreter (run, dump, instructions,
+# elapsed, rate) y da exactamente la misma salida, pero en lugar de
+# recorrer el árbol en cada ejecución ejecuta un bucle de despacho sobre
+# las instrucciones ya compiladas: las variables son posiciones de una
+# lista y las conversiones de tipos están resueltas al compilar.
+# Uso: python3 main.py --run --vm <fichero.vip>
+import time
+
+from bytecode import (
+    ADD,
+    BINARY_END,
+    CALL,
+    COMPARISON_SYMBOLS,
+    CONST,
+    CONVERT,
+    DUP,
+    EQ,
+    FIELD,
+    GE,
+    GT,
+    HALT,
+    INDEX,
+    JUMP,
+    JUMP_IF_FALSE,
+    JUMP_IF_FALSE_OR_POP,
+    JUMP_IF_TRUE,
+    JUMP_IF_TRUE_OR_POP,
+    LE,
+    LOAD,
+    LT,
+    MUL,
+    NE,
+    NEG,
+    NEW_RECORD,
+    NEW_VECTOR,
+    NOT,
+    ORD,
+    POP,
+    RETURN,
+    STORE,
+    STORE_FIELD,
+    STORE_INDEX,
+    SUB,
+    TO_FLOAT,
+    Compiler,
+)
+from exception import ExecutionError
+from interpreter import convert, dump_values, zero_value
+
+
+class VirtualMachine:
+    """
+    Compila y ejecuta un objects.Program. records es la tabla de registros
+    del parser. instructions cuenta las instrucciones de bytecode
+    ejecutadas y elapsed el tiempo de la última ejecución (compilación
+    incluida), en segundos.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.globals = {}
+        self.functions = []
+        self._decoded = []
+        self.instructions = 0
+        self.elapsed = 0.0
+
+    def run(self, program):
+        """Compila el programa y lo ejecuta"""
+        start = time.perf_counter()
+        try:
+            compiler = Compiler()
+            main = compiler.compile(program)
+            self.functions = compiler.functions
+            # Las instrucciones se guardan en array('i'); para ejecutarlas se
+            # pasan una vez a listas, que se indexan más deprisa
+            self._decoded = [function.code.tolist() for function in self.functions]
+            slots = [None] * len(main.slots)
+            try:
+                self._execute(main, main.code.tolist(), slots)
+            except RecursionError:
+                raise ExecutionError("Demasiadas llamadas anidadas")
+            finally:
+                # Las variables sin valor (None) no llegaron a declararse
+                self.globals = {
+                    name: slots[slot]
+                    for name, slot in main.slots.items()
+                    if slots[slot] is not None
+                }
+        finally:
+            self.elapsed = time.perf_counter() - start
+
+    def dump(self, symbols):
+        """Líneas con el valor final de cada variable global"""
+        return dump_values(self.globals, symbols)
+
+    def rate(self):
+        """Instrucciones por segundo de la última ejecución"""
+        return self.instructions / self.elapsed if self.elapsed else 0.0
+
+    def _execute(self, unit, code, slots):
+        """
+        Ejecuta un CodeUnit (code: sus instrucciones, ver run) con el marco
+        slots (los parámetros en las primeras posiciones, el resto a None) y
+        devuelve su resultado. Las instrucciones más frecuentes en los
+        bucles se comprueban antes.
+        """
+        constants = unit.constants
+        functions = self.functions
+        decoded = self._decoded
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        pc = executed = 0
+        try:
+            while True:
+                opcode = code[pc]
+                operand = code[pc + 1]
+                pc += 2
+                executed += 1
+
+                if opcode < BINARY_END:
+                    # Operando derecho: pila, constante o variable
+                    if operand == 0:
+                        right = pop()
+                    elif operand > 0:
+                        right = constants[operand - 1]
+                    else:
+                        right = slots[~operand]
+                        if right is None:
+                            self._unset(unit, ~operand)
+
+                    if opcode == ADD:
+                        stack[-1] = stack[-1] + right
+                    elif opcode == LT:
+                        stack[-1] = stack[-1] < right
+                    elif opcode == SUB:
+                        stack[-1] = stack[-1] - right
+                    elif opcode == MUL:
+                        stack[-1] = stack[-1] * right
+                    elif opcode == INDEX:
+                        vector = stack[-1]
+                        if not 0 <= right < len(vector):
+                            self._out_of_range(right, vector)
+                        stack[-1] = vector[right]
+                    elif opcode == STORE_INDEX:
+                        vector = pop()
+                        if not 0 <= right < len(vector):
+                            self._out_of_range(right, vector)
+                        vector[right] = pop()
+                    elif opcode == EQ:
+                        stack[-1] = stack[-1] == right
+                    elif opcode == GT:
+                        stack[-1] = stack[-1] > right
+                    elif opcode == LE:
+                        stack[-1] = stack[-1] <= right
+                    elif opcode == GE:
+                        stack[-1] = stack[-1] >= right
+                    elif opcode == NE:
+                        stack[-1] = stack[-1] != right
+                    else:  # DIV
+                        stack[-1] = stack[-1] / right
+                elif opcode == LOAD:
+                    value = slots[operand]
+                    if value is None:
+                        self._unset(unit, operand)
+                    push(value)
+                elif opcode == STORE:
+                    slots[operand] = pop()
+                elif opcode == JUMP_IF_TRUE:
+                    if pop():
+                        pc = operand
+                elif opcode == JUMP_IF_FALSE:
+                    if not pop():
+                        pc = operand
+                elif opcode == JUMP:
+                    pc = operand
+                elif opcode == CONST:
+                    push(constants[operand])
+                elif opcode == FIELD:
+                    stack[-1] = stack[-1][constants[operand]]
+                elif opcode == STORE_FIELD:
+                    record = pop()
+                    record[constants[operand]] = pop()
+                elif opcode == TO_FLOAT:
+                    stack[-1] = float(stack[-1])
+                elif opcode == CALL:
+                    function = functions[operand]
+                    count = len(function.parameters)
+                    frame = stack[len(stack) - count :]
+                    del stack[len(stack) - count :]
+                    frame.extend([None] * (len(function.slots) - count))
+                    push(self._execute(function, decoded[operand], frame))
+                elif opcode == RETURN:
+                    return pop()
+                elif opcode == ORD:
+                    stack[-1] = ord(stack[-1])
+                elif opcode == CONVERT:
+                    stack[-1] = convert(stack[-1], constants[operand])
+                elif opcode == NEG:
+                    stack[-1] = -stack[-1]
+                elif opcode == NOT:
+                    stack[-1] = not stack[-1]
+                elif opcode == DUP:
+                    push(stack[-1])
+                elif opcode == POP:
+                    pop()
+                elif opcode == JUMP_IF_FALSE_OR_POP:
+                    if stack[-1]:
+                        pop()
+                    else:
+                        pc = operand
+                elif opcode == JUMP_IF_TRUE_OR_POP:
+                    if stack[-1]:
+                        pc = operand
+                    else:
+                        pop()
+                elif opcode == NEW_VECTOR:
+                    datatype = constants[operand]
+                    stack[-1] = [
+                        zero_value(datatype, self.records) for _ in range(stack[-1])
+                    ]
+                elif opcode == NEW_RECORD:
+                    push(zero_value(constants[operand], self.records))
+                elif opcode == HALT:
+                    return None
+                else:
+                    raise ExecutionError(f"Instrucción desconocida: {opcode}")
+        except ZeroDivisionError:
+            raise ExecutionError("División por cero")
+        except TypeError:
+            # Registros o vectores comparados con <, >, <= o >=
+            if opcode in COMPARISON_SYMBOLS:
+                raise ExecutionError(
+                    f"Los valores no se pueden comparar con "
+                    f"`{COMPARISON_SYMBOLS[opcode]}`"
+                )
+            raise
+        finally:
+            self.instructions += executed
+
+    @staticmethod
+    def _unset(unit, slot):
+        # Declarada en una rama que no se ha ejecutado
+        raise ExecutionError(f"La variable `{unit.names[slot]}` no tiene valor")
+
+    @staticmethod
+    def _out_of_range(index, vector):
+        raise ExecutionError(f"Índice {index} fuera de rango (longitud {len(vector)})")